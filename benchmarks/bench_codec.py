@@ -0,0 +1,124 @@
+import datetime
+import timeit
+
+import bson
+from bson.raw_bson import RawBSONDocument
+from pydantic import BaseModel, Field
+
+from morm import Database, Model
+from morm.orm import _codec, _construct_value
+
+
+class Item(BaseModel):
+    name: str = Field(alias="n")
+    qty: int
+
+
+db = Database(name="bench")
+
+
+@db
+class Order(Model):
+    number: str = Field(alias="no")
+    total: float
+    created: datetime.datetime
+    customer: str
+    paid: bool
+    tags: list[str]
+    counts: dict[str, int]
+    item: Item
+    items: list[Item]
+    note: str | None = None
+
+
+@db
+class Event(Model):
+    name: str = Field(alias="n")
+    counter: int
+    score: float
+    created: datetime.datetime
+    owner: str
+    active: bool
+    tags: list[str]
+    payload: dict[str, int]
+
+
+def make_doc(size: int) -> dict:
+    return {
+        "_id": bson.ObjectId(),
+        "no": "A-1",
+        "total": 10.5,
+        "created": datetime.datetime(2024, 1, 1),
+        "customer": "customer",
+        "paid": True,
+        "tags": [f"tag-{i}" for i in range(size)],
+        "counts": {f"key-{i}": i for i in range(size)},
+        "item": {"n": "item", "qty": 1},
+        "items": [{"n": f"item-{i}", "qty": i} for i in range(size)],
+    }
+
+
+def construct_generic(doc: dict) -> Order:
+    # Trusted construction as it was done before the per-model plan
+    values = {}
+    for name, field in Order.model_fields.items():
+        key = field.alias or name
+        if key in doc:
+            values[name] = _construct_value(field.annotation, doc[key])
+    return Order.model_construct(**values)
+
+
+def bench(func, number: int) -> float:
+    return timeit.timeit(func, number=number) / number * 1e6
+
+
+def main():
+    codec = _codec(Order)
+
+    event = Event.model_validate(
+        {
+            "_id": bson.ObjectId(),
+            "n": "event",
+            "counter": 1,
+            "score": 1.0,
+            "created": datetime.datetime(2024, 1, 1),
+            "owner": "owner",
+            "active": True,
+            "tags": ["a", "b", "c"],
+            "payload": {"a": 1, "b": 2},
+        }
+    )
+    event_codec = _codec(Event)
+    dump = bench(lambda: event.model_dump(by_alias=True, exclude={"id"}), 20_000)
+    encode = bench(
+        lambda: event_codec.encode(event, event_codec.document_fields), 20_000
+    )
+    print(f"flat model encode: model_dump {dump:>8.1f}us, plan {encode:>8.1f}us")
+
+    for size in (3, 100):
+        doc = make_doc(size)
+        raw = bson.encode(doc)
+        obj = Order.model_validate(doc)
+        number = 20_000 if size < 10 else 1_000
+
+        dump = bench(lambda: obj.model_dump(by_alias=True, exclude={"id"}), number)
+        encode = bench(lambda: codec.encode(obj, codec.document_fields), number)
+        validate = bench(lambda: Order.model_validate(bson.decode(raw)), number)
+        generic = bench(lambda: construct_generic(bson.decode(raw)), number)
+        decode = bench(lambda: codec.decode(bson.decode(raw)), number)
+        lazy = bench(
+            lambda: Order._from_document(RawBSONDocument(raw), trusted=True).total,
+            number,
+        )
+
+        print(f"{size:>4} items per list")
+        print(f"  encode: model_dump {dump:>8.1f}us, plan {encode:>8.1f}us")
+        print(
+            f"  decode: validate {validate:>8.1f}us, generic construct "
+            f"{generic:>8.1f}us, plan {decode:>8.1f}us, "
+            f"lazy raw + 1 field {lazy:>8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
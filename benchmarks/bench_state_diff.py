@@ -0,0 +1,50 @@
+import timeit
+
+import bson
+
+from morm import Model
+from morm.utils import recursive_diff
+
+
+class Event(Model):
+    name: str
+    counter: int
+    tags: list[str]
+    payload: dict[str, int]
+
+
+def make(size: int) -> Event:
+    doc = {
+        "_id": bson.ObjectId(),
+        "name": "event",
+        "counter": 0,
+        "tags": [f"tag-{i}" for i in range(size)],
+        "payload": {f"key-{i}": i for i in range(size)},
+    }
+    return Event._from_document(doc)
+
+
+def full_diff(obj: Event):
+    return recursive_diff(obj._state_snapshot, obj._make_dump())
+
+
+def tracked_diff(obj: Event):
+    return obj._get_state_diff()
+
+
+def main():
+    for size in (10, 1_000, 100_000):
+        obj = make(size)
+        obj.counter += 1
+
+        full = timeit.timeit(lambda: full_diff(obj), number=20) / 20
+        tracked = timeit.timeit(lambda: tracked_diff(obj), number=20) / 20
+
+        print(
+            f"{size:>7} items: full dump+diff {full * 1e6:>10.1f}us, "
+            f"tracked {tracked * 1e6:>8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,27 @@ from pymongo import DESCENDING as DESC
 from pymongo import GEO2D, GEOSPHERE, HASHED, TEXT
 from pymongo.errors import DuplicateKeyError
 
+from morm.cache import Cache, LRUCache
+from morm.metrics import Metrics, Operation
 from morm.orm import (
+    Aggregation,
     AlreadyExists,
     Database,
     DatabaseException,
     DoesNotExist,
+    Expression,
+    FlushError,
+    IdentityMap,
     Index,
     Model,
+    NotLoaded,
     ObjectId,
+    Query,
+    QueryTimeout,
+    Reference,
+    UnitOfWork,
+    Writer,
+    deadline,
 )
 
 __version__ = "0.2.4"
@@ -21,9 +34,24 @@ __all__ = [
     "Model",
     "Index",
     "ObjectId",
+    "Reference",
+    "Query",
+    "Aggregation",
+    "Expression",
     "DatabaseException",
     "AlreadyExists",
     "DoesNotExist",
+    "NotLoaded",
+    "QueryTimeout",
+    "FlushError",
+    "IdentityMap",
+    "Cache",
+    "LRUCache",
+    "Metrics",
+    "Operation",
+    "UnitOfWork",
+    "Writer",
+    "deadline",
     "InvalidId",
     "ASC",
     "DESC",
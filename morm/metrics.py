@@ -0,0 +1,223 @@
+import bisect
+import collections
+import logging
+import typing
+
+import bson
+from bson.errors import InvalidDocument
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+logger = logging.getLogger("morm")
+slow_logger = logger.getChild("slow")
+
+
+def filter_shape(query: typing.Any) -> typing.Any:
+    if isinstance(query, typing.Mapping):
+        return {key: filter_shape(value) for key, value in query.items()}
+    if isinstance(query, (list, tuple)):
+        if any(isinstance(value, typing.Mapping) for value in query):
+            # Clauses of the same shape collapse into one
+            shapes = []
+            for value in query:
+                shape = filter_shape(value)
+                if shape not in shapes:
+                    shapes.append(shape)
+            return shapes
+        return ["?"]
+    return "?"
+
+
+def document_size(doc: typing.Any) -> int:
+    try:
+        return len(bson.encode(doc))
+    except (InvalidDocument, TypeError):
+        # Types only the client's codec options know how to encode
+        return 0
+
+
+class Operation:
+    __slots__ = (
+        "model",
+        "name",
+        "duration",
+        "validation",
+        "documents",
+        "bytes_sent",
+        "filter",
+        "error",
+    )
+
+    def __init__(self, model: str, name: str):
+        self.model = model
+        self.name = name
+        self.duration = 0.0
+        self.validation = 0.0
+        self.documents = 0
+        self.bytes_sent = 0
+        self.filter: typing.Any = None
+        self.error: typing.Optional[str] = None
+
+    @property
+    def wire(self) -> float:
+        return max(self.duration - self.validation, 0.0)
+
+    def observe(self, query: typing.Any = None, *documents: typing.Any):
+        if query is not None:
+            if self.filter is None:
+                self.filter = filter_shape(query)
+            self.bytes_sent += document_size(query)
+        for doc in documents:
+            self.bytes_sent += document_size(doc)
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {
+            "model": self.model,
+            "operation": self.name,
+            "duration": self.duration,
+            "wire": self.wire,
+            "validation": self.validation,
+            "documents": self.documents,
+            "bytes_sent": self.bytes_sent,
+            "filter": self.filter,
+            "error": self.error,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"<Operation {self.model}.{self.name} {self.duration * 1000:.2f}ms "
+            f"docs={self.documents} sent={self.bytes_sent}B>"
+        )
+
+
+class Histogram:
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class OperationStats:
+    def __init__(self, buckets: typing.Sequence[float] = DEFAULT_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.wire = 0.0
+        self.validation = 0.0
+        self.documents = 0
+        self.bytes_sent = 0
+        self.errors = 0
+
+    def observe(self, op: Operation):
+        self.latency.observe(op.duration)
+        self.wire += op.wire
+        self.validation += op.validation
+        self.documents += op.documents
+        self.bytes_sent += op.bytes_sent
+        if op.error is not None:
+            self.errors += 1
+
+    def as_dict(self) -> dict[str, typing.Any]:
+        return {
+            "latency": self.latency.as_dict(),
+            "wire": self.wire,
+            "validation": self.validation,
+            "documents": self.documents,
+            "bytes_sent": self.bytes_sent,
+            "errors": self.errors,
+        }
+
+
+class Metrics:
+    def __init__(
+        self,
+        slow_ms: typing.Optional[float] = 100.0,
+        callback: typing.Optional[typing.Callable[[Operation], None]] = None,
+        buckets: typing.Sequence[float] = DEFAULT_BUCKETS,
+        slow_log_size: int = 100,
+    ):
+        self.slow_ms = slow_ms
+        self.callback = callback
+        self.buckets = buckets
+
+        self.stats: dict[tuple[str, str], OperationStats] = {}
+        self.slow: collections.deque[Operation] = collections.deque(
+            maxlen=slow_log_size
+        )
+
+    def record(self, op: Operation):
+        key = (op.model, op.name)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = OperationStats(self.buckets)
+        stats.observe(op)
+
+        if self.slow_ms is not None and op.duration * 1000 >= self.slow_ms:
+            self.slow.append(op)
+            slow_logger.warning(
+                "Slow %s.%s: %.1fms (wire %.1fms, validation %.1fms), "
+                "%d document(s), filter %s",
+                op.model,
+                op.name,
+                op.duration * 1000,
+                op.wire * 1000,
+                op.validation * 1000,
+                op.documents,
+                op.filter,
+            )
+
+        if self.callback is not None:
+            try:
+                self.callback(op)
+            except Exception:
+                logger.exception("Metrics callback failed")
+
+    def snapshot(self) -> dict[str, dict[str, dict[str, typing.Any]]]:
+        result = {}
+        for (model, name), stats in self.stats.items():
+            result.setdefault(model, {})[name] = stats.as_dict()
+        return result
+
+    def reset(self):
+        self.stats.clear()
+        self.slow.clear()
@@ -1,18 +1,55 @@
 from __future__ import annotations
 
+import array
+import asyncio
+import base64
+import contextvars
+import copy
+import datetime
+import decimal
+import enum
 import functools
+import logging
+import random
+import time
+import types
 import typing
-from contextlib import asynccontextmanager
+import uuid
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 
+import annotated_types
 import bson
 import gridfs
 import pymongo
+from bson.raw_bson import RawBSONDocument
 from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, create_model
 from pydantic.json_schema import JsonSchemaValue
 from pydantic_core import core_schema
+from pymongo.asynchronous.client_session import AsyncClientSession
 from pymongo.asynchronous.database import AsyncCollection, AsyncDatabase
-
-from morm.utils import recursive_diff
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+from pymongo.write_concern import WriteConcern
+
+from morm.cache import Cache
+from morm.metrics import Metrics, Operation
+from morm.utils import TrackedDict, TrackedList, recursive_diff, update_diff
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+_ReadPreference = typing.Union[
+    Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+]
 
 
 class ObjectIdAnnotation:
@@ -45,6 +82,1154 @@ class ObjectIdAnnotation:
 
 ObjectId = typing.Annotated[bson.ObjectId, ObjectIdAnnotation]
 
+ModelT = typing.TypeVar("ModelT", bound="Model")
+
+
+class Reference(typing.Generic[ModelT]):
+    __slots__ = ("model", "id", "_obj")
+
+    def __init__(
+        self,
+        model: typing.Type[ModelT],
+        id: bson.ObjectId,
+        obj: typing.Optional[ModelT] = None,
+    ):
+        self.model = model
+        self.id = id
+        self._obj = obj
+
+    @property
+    def loaded(self) -> bool:
+        return self._obj is not None
+
+    @property
+    def obj(self) -> ModelT:
+        if self._obj is None:
+            raise RuntimeError("Reference is not fetched!")
+        return self._obj
+
+    async def fetch(self) -> ModelT:
+        if self._obj is None:
+            self._obj = await self.model.get(id=self.id)
+        return self._obj
+
+    @staticmethod
+    async def resolve(refs: typing.Iterable[Reference]):
+        pending: dict[typing.Type[Model], list[Reference]] = {}
+        for ref in refs:
+            if not ref.loaded:
+                pending.setdefault(ref.model, []).append(ref)
+
+        for model, model_refs in pending.items():
+            ids = list({ref.id for ref in model_refs})
+            objs = {obj.id: obj for obj in await model.get_many(_id={"$in": ids})}
+            for ref in model_refs:
+                ref._obj = objs.get(ref.id)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Reference):
+            return self.model is other.model and self.id == other.id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"Reference[{self.model.__name__}]({self.id!r})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source_type, _handler
+    ) -> core_schema.CoreSchema:
+        (model,) = typing.get_args(source_type)
+
+        def validate(v: typing.Any) -> Reference:
+            if isinstance(v, Reference):
+                return v
+            if isinstance(v, Model):
+                if v.id is None:
+                    raise ValueError("Referenced object is not saved")
+                return cls(model, v.id, v)
+            if isinstance(v, bson.ObjectId):
+                return cls(model, v)
+            if isinstance(v, str) and bson.ObjectId.is_valid(v):
+                return cls(model, bson.ObjectId(v))
+
+            raise ValueError("Invalid reference")
+
+        def serialize(v: Reference, info) -> typing.Any:
+            return str(v.id) if info.mode_is_json() else v.id
+
+        return core_schema.no_info_plain_validator_function(
+            validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                serialize, info_arg=True
+            ),
+        )
+
+    @classmethod
+    def __get_pydantic_json_schema__(cls, _core_schema, handler) -> JsonSchemaValue:
+        return handler(core_schema.str_schema())
+
+
+def _is_model_type(annotation: typing.Any) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _matches(annotation: typing.Any, value: typing.Any) -> bool:
+    origin = typing.get_origin(annotation) or annotation
+    if origin is typing.Annotated:
+        return _matches(typing.get_args(annotation)[0], value)
+    if isinstance(origin, type) and issubclass(origin, enum.Enum):
+        return any(value == member.value for member in origin)
+    if isinstance(value, dict):
+        return _is_model_type(origin) or origin is dict
+    if isinstance(value, list):
+        return origin in (list, set, frozenset, tuple)
+    return False
+
+
+def _construct_value(annotation: typing.Any, value: typing.Any) -> typing.Any:
+    if value is None:
+        return None
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _construct_value(args[0], value)
+
+    if origin is Reference:
+        return value if isinstance(value, Reference) else Reference(args[0], value)
+
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return value if isinstance(value, annotation) else annotation(value)
+
+    if _is_model_type(annotation):
+        return _construct_model(annotation, value) if isinstance(value, dict) else value
+
+    if origin in (typing.Union, types.UnionType):
+        arg = next((a for a in args if _matches(a, value)), typing.Any)
+        return _construct_value(arg, value)
+
+    if origin in (list, set, frozenset) and args and isinstance(value, list):
+        return origin(_construct_value(args[0], v) for v in value)
+
+    if origin is dict and len(args) == 2 and isinstance(value, dict):
+        return {k: _construct_value(args[1], v) for k, v in value.items()}
+
+    # Copy untyped containers so the instance never shares them with the snapshot
+    if isinstance(value, list):
+        return [_construct_value(typing.Any, v) for v in value]
+
+    if isinstance(value, dict):
+        return {k: _construct_value(typing.Any, v) for k, v in value.items()}
+
+    return value
+
+
+@functools.cache
+def _validation_copies(model_cls: typing.Type[BaseModel]) -> bool:
+    return all(
+        _annotation_copies(field.annotation)
+        for field in model_cls.model_fields.values()
+    )
+
+
+def _annotation_copies(annotation: typing.Any) -> bool:
+    if annotation in (typing.Any, object, dict, list, set, tuple):
+        return False
+
+    if typing.get_origin(annotation) is Reference:
+        return True
+
+    if _is_model_type(annotation):
+        return _validation_copies(annotation)
+
+    args = typing.get_args(annotation)
+    if typing.get_origin(annotation) is typing.Annotated:
+        args = args[:1]
+
+    return all(_annotation_copies(arg) for arg in args if arg is not Ellipsis)
+
+
+def _construct_model(model_cls: typing.Type[BaseModel], data: dict[str, typing.Any]):
+    return _codec(model_cls).decode(data)
+
+
+# Marks values that only pydantic knows how to serialise
+_PYDANTIC = object()
+
+
+def _plain_metadata(metadata: typing.Iterable[typing.Any]) -> bool:
+    return all(
+        m is ObjectIdAnnotation or isinstance(m, annotated_types.BaseMetadata)
+        for m in metadata
+    )
+
+
+def _optional(encoder):
+    if encoder is None or encoder is _PYDANTIC:
+        return encoder
+    return lambda v: None if v is None else encoder(v)
+
+
+def _is_decimal(annotation: typing.Any) -> bool:
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _is_decimal(args[0])
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in args if arg is not type(None)]
+        return len(args) == 1 and _is_decimal(args[0])
+
+    return isinstance(annotation, type) and issubclass(annotation, decimal.Decimal)
+
+
+def _has_decimal(annotation: typing.Any, seen: typing.Optional[set] = None) -> bool:
+    if _is_model_type(annotation):
+        seen = set() if seen is None else seen
+        if annotation in seen:
+            return False
+        seen.add(annotation)
+        return any(
+            _has_decimal(field.annotation, seen)
+            for field in annotation.model_fields.values()
+        )
+    if isinstance(annotation, type) and issubclass(annotation, decimal.Decimal):
+        return True
+    return any(_has_decimal(arg, seen) for arg in typing.get_args(annotation))
+
+
+def _decode_decimal(value: typing.Any) -> typing.Any:
+    return value.to_decimal() if isinstance(value, bson.Decimal128) else value
+
+
+def _bson_decimals(value: typing.Any) -> typing.Any:
+    # BSON has no encoding for Decimal, so every occurrence is converted
+    if isinstance(value, decimal.Decimal):
+        return bson.Decimal128(value)
+    if isinstance(value, dict):
+        return {k: _bson_decimals(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_bson_decimals(v) for v in value]
+    return value
+
+
+def _python_decimals(value: typing.Any) -> typing.Any:
+    if isinstance(value, bson.Decimal128):
+        return value.to_decimal()
+    if isinstance(value, dict):
+        return {k: _python_decimals(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_python_decimals(v) for v in value]
+    return value
+
+
+def _value_encoder(annotation: typing.Any):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _value_encoder(args[0]) if _plain_metadata(args[1:]) else _PYDANTIC
+    if isinstance(annotation, type) and issubclass(annotation, decimal.Decimal):
+        return bson.Decimal128
+    if _is_scalar(annotation):
+        return None
+    if origin is Reference:
+        return lambda v: v.id
+
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in args if arg is not type(None)]
+        return _optional(_value_encoder(args[0])) if len(args) == 1 else _PYDANTIC
+
+    if origin is list and args:
+        encoder = _value_encoder(args[0])
+        if encoder is None or encoder is _PYDANTIC:
+            return list if encoder is None else _PYDANTIC
+        return lambda v: [encoder(x) for x in v]
+
+    if origin is dict and len(args) == 2:
+        encoder = _value_encoder(args[1])
+        if encoder is None or encoder is _PYDANTIC:
+            return dict if encoder is None else _PYDANTIC
+        return lambda v: {k: encoder(x) for k, x in v.items()}
+
+    return _PYDANTIC
+
+
+def _value_decoder(annotation: typing.Any):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _value_decoder(args[0])
+    if origin in (typing.Union, types.UnionType):
+        # None never reaches a decoder, so Optional[X] decodes like X
+        non_null = [arg for arg in args if arg is not type(None)]
+        if len(non_null) == 1:
+            return _value_decoder(non_null[0])
+        if any(isinstance(a, type) and issubclass(a, enum.Enum) for a in non_null):
+            return functools.partial(_construct_value, annotation)
+    if isinstance(annotation, type) and issubclass(annotation, enum.Enum):
+        return lambda v: v if isinstance(v, annotation) else annotation(v)
+    if _is_decimal(annotation):
+        return _decode_decimal
+    if _is_scalar(annotation):
+        return None
+    if origin is Reference:
+        model = args[0]
+        return lambda v: v if isinstance(v, Reference) else Reference(model, v)
+    if _is_model_type(annotation):
+        return lambda v: _codec(annotation).decode(v) if isinstance(v, dict) else v
+
+    if origin in (list, set, frozenset) and args:
+        decoder = _value_decoder(args[0])
+        if decoder is None:
+            return lambda v: origin(v) if isinstance(v, list) else v
+        return lambda v: (
+            origin(None if x is None else decoder(x) for x in v)
+            if isinstance(v, list)
+            else v
+        )
+
+    if origin is dict and len(args) == 2:
+        decoder = _value_decoder(args[1])
+        if decoder is None:
+            return lambda v: dict(v) if isinstance(v, dict) else v
+        return lambda v: (
+            {k: None if x is None else decoder(x) for k, x in v.items()}
+            if isinstance(v, dict)
+            else v
+        )
+
+    return functools.partial(_construct_value, annotation)
+
+
+class ModelCodec:
+    def __init__(self, model_cls: typing.Type[BaseModel]):
+        self.model_cls = model_cls
+
+        decorators = model_cls.__pydantic_decorators__
+        self.fallback = bool(
+            decorators.field_serializers
+            or decorators.model_serializers
+            or model_cls.model_computed_fields
+            or model_cls.model_config.get("extra") == "allow"
+        )
+
+        self.encoders: list[tuple[str, str, typing.Any]] = []
+        self.decoders: dict[str, tuple[str, typing.Any]] = {}
+        # Names and keys of fields that may hold Decimal128 in documents
+        self.decimals: set[str] = set()
+
+        for name, field in model_cls.model_fields.items():
+            self.decoders[name] = (
+                field.alias or name,
+                _value_decoder(field.annotation),
+            )
+
+            if _has_decimal(field.annotation):
+                self.decimals.update((name, field.alias or name))
+
+            if field.exclude or getattr(field, "exclude_if", None) is not None:
+                self.fallback = True
+                continue
+
+            encoder = (
+                _value_encoder(field.annotation)
+                if _plain_metadata(field.metadata)
+                else _PYDANTIC
+            )
+            if encoder is _PYDANTIC:
+                # One pydantic-core call beats mixing it with a Python loop
+                self.fallback = True
+
+            key = field.serialization_alias or field.alias or name
+            self.encoders.append((name, key, encoder))
+
+        self.defaults = [
+            (name, field)
+            for name, field in model_cls.model_fields.items()
+            if not field.is_required()
+        ]
+
+        # default_factory_takes_validated_data only exists in pydantic >= 2.11
+        self.private_defaults = [
+            (name, attr, getattr(attr, "default_factory_takes_validated_data", False))
+            for name, attr in model_cls.__private_attributes__.items()
+        ]
+
+        self.document_fields = frozenset(model_cls.model_fields.keys() - {"id"})
+
+    def encode(
+        self, obj: BaseModel, include: typing.Optional[typing.Container[str]] = None
+    ) -> dict[str, typing.Any]:
+        if self.fallback:
+            # Bypasses Model.model_dump, which refuses partially loaded objects
+            data = BaseModel.model_dump(obj, by_alias=True, include=include)
+            return _bson_decimals(data) if self.decimals else data
+
+        values = obj.__dict__
+        data = {}
+        for name, key, encoder in self.encoders:
+            if name not in values or (include is not None and name not in include):
+                continue
+
+            if encoder is None:
+                data[key] = values[name]
+            else:
+                value = values[name]
+                data[key] = None if value is None else encoder(value)
+
+        return data
+
+    def prepare(self, data: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        # Pydantic does not accept Decimal128 for Decimal fields
+        if not self.decimals:
+            return data
+        return {
+            k: _python_decimals(v) if k in self.decimals else v for k, v in data.items()
+        }
+
+    def prepare_field(self, name: str, value: typing.Any) -> typing.Any:
+        return _python_decimals(value) if name in self.decimals else value
+
+    def decode_field(self, name: str, value: typing.Any) -> typing.Any:
+        _, decoder = self.decoders[name]
+        return value if decoder is None or value is None else decoder(value)
+
+    def decode(self, data: typing.Mapping[str, typing.Any]) -> BaseModel:
+        values = {}
+        for name, (key, decoder) in self.decoders.items():
+            if key in data:
+                value = data[key]
+            elif name in data:
+                value = data[name]
+            else:
+                continue
+
+            values[name] = value if decoder is None or value is None else decoder(value)
+
+        for name, field in self.defaults:
+            if name not in values:
+                values[name] = field.get_default(call_default_factory=True)
+
+        return self.instantiate(values)
+
+    def _private(
+        self, values: dict[str, typing.Any]
+    ) -> typing.Optional[dict[str, typing.Any]]:
+        if not self.private_defaults:
+            return None
+
+        private = {}
+        for name, attr, takes_data in self.private_defaults:
+            if takes_data:
+                private[name] = attr.default_factory(values)
+            elif attr.default_factory is not None:
+                private[name] = attr.default_factory()
+            elif isinstance(attr.default, (type(None), frozenset, str, int, float)):
+                private[name] = attr.default
+            else:
+                private[name] = copy.deepcopy(attr.default)
+        return private
+
+    def instantiate(self, values: dict[str, typing.Any]) -> BaseModel:
+        # Same as model_construct() without re-checking every field
+        model_cls = self.model_cls
+        obj = model_cls.__new__(model_cls)
+        object.__setattr__(obj, "__dict__", values)
+        object.__setattr__(obj, "__pydantic_fields_set__", set(values))
+        object.__setattr__(obj, "__pydantic_extra__", None)
+        object.__setattr__(obj, "__pydantic_private__", self._private(values))
+        if model_cls.__pydantic_post_init__:
+            obj.model_post_init(None)
+        return obj
+
+
+_codec = functools.cache(ModelCodec)
+
+
+def _inflate(value: typing.Any, codec_options: bson.CodecOptions) -> typing.Any:
+    if isinstance(value, RawBSONDocument):
+        return bson.decode(value.raw, codec_options)
+    if isinstance(value, list):
+        return [_inflate(v, codec_options) for v in value]
+    return value
+
+
+logger = logging.getLogger("morm")
+
+
+_SCALAR_TYPES = (
+    str,
+    int,
+    float,
+    bool,
+    bytes,
+    bson.ObjectId,
+    bson.Decimal128,
+    datetime.date,
+    datetime.time,
+    datetime.timedelta,
+    decimal.Decimal,
+    uuid.UUID,
+    enum.Enum,
+    type(None),
+)
+
+
+def _is_scalar(annotation: typing.Any) -> bool:
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _is_scalar(args[0])
+    if origin is typing.Literal:
+        return True
+    if origin in (typing.Union, types.UnionType):
+        return all(_is_scalar(arg) for arg in args)
+    if origin in (tuple, frozenset):
+        return bool(args) and all(_is_scalar(a) for a in args if a is not Ellipsis)
+
+    return isinstance(annotation, type) and issubclass(annotation, _SCALAR_TYPES)
+
+
+def _field_kind(annotation: typing.Any) -> str:
+    if _is_scalar(annotation):
+        return "scalar"
+
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is Reference:
+        return "reference"
+
+    if origin is typing.Annotated:
+        return _field_kind(args[0])
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in args if arg is not type(None)]
+        return _field_kind(args[0]) if len(args) == 1 else "opaque"
+    if origin is list and args and _is_scalar(args[0]):
+        return "list"
+    if origin is dict and len(args) == 2 and _is_scalar(args[1]):
+        return "dict"
+
+    return "opaque"
+
+
+@functools.cache
+def _field_kinds(model_cls: typing.Type[BaseModel]) -> dict[str, str]:
+    # Scalars only change through assignment and lists/dicts of scalars are
+    # wrapped into tracked containers; opaque fields are diffed on every save.
+    return {
+        name: _field_kind(field.annotation)
+        for name, field in model_cls.model_fields.items()
+        if name != "id"
+    }
+
+
+@functools.cache
+def _field_keys(model_cls: typing.Type[BaseModel]) -> frozenset[str]:
+    # Removed keys are unset anywhere below a declared field. Top-level keys the
+    # model does not know about are left alone so they survive a save.
+    return frozenset(
+        field.alias or name
+        for name, field in model_cls.model_fields.items()
+        if name != "id"
+    )
+
+
+_TYPECODES = {bool: "b", int: "q", float: "d"}
+
+
+def _column_typecode(annotation: typing.Any) -> typing.Optional[str]:
+    if typing.get_origin(annotation) is typing.Annotated:
+        return _column_typecode(typing.get_args(annotation)[0])
+    return _TYPECODES.get(annotation) if isinstance(annotation, type) else None
+
+
+def _column_result(column: array.array | list) -> typing.Any:
+    if numpy is None or not isinstance(column, array.array):
+        return column
+
+    dtypes = {"b": numpy.bool_, "q": numpy.int64, "d": numpy.float64}
+    return numpy.frombuffer(column, dtype=dtypes[column.typecode])
+
+
+def _doc_matches(doc: dict[str, typing.Any], query: dict[str, typing.Any]) -> bool:
+    return all(doc.get(k) == v for k, v in query.items())
+
+
+def _encode(value: typing.Any) -> typing.Any:
+    if isinstance(value, (Model, Reference)):
+        return value.id
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, decimal.Decimal):
+        return bson.Decimal128(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _nested_model(annotation: typing.Any) -> typing.Optional[typing.Type[BaseModel]]:
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is typing.Annotated:
+        return _nested_model(args[0])
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in args if arg is not type(None)]
+        return _nested_model(args[0]) if len(args) == 1 else None
+    if origin in (list, set, frozenset, tuple) and args:
+        return _nested_model(args[0])
+
+    return annotation if _is_model_type(annotation) else None
+
+
+class Expression:
+    def __and__(self, other: Expression) -> Expression:
+        return Logical.combine("$and", self, other)
+
+    def __or__(self, other: Expression) -> Expression:
+        return Logical.combine("$or", self, other)
+
+    def __invert__(self) -> Expression:
+        return Logical("$nor", [self])
+
+    def compile(self) -> dict[str, typing.Any]:
+        raise NotImplementedError
+
+
+class Condition(Expression):
+    def __init__(self, key: str, op: str, value: typing.Any):
+        self.key = key
+        self.op = op
+        self.value = value
+
+    def compile(self) -> dict[str, typing.Any]:
+        value = _encode(self.value)
+        if self.op == "$eq":
+            return {self.key: value}
+        return {self.key: {self.op: value}}
+
+    def __repr__(self) -> str:
+        return f"Condition({self.key!r}, {self.op!r}, {self.value!r})"
+
+
+class Logical(Expression):
+    def __init__(self, op: str, children: list[Expression]):
+        self.op = op
+        self.children = children
+
+    @classmethod
+    def combine(cls, op: str, *exprs: Expression) -> Logical:
+        children = []
+        for expr in exprs:
+            if not isinstance(expr, Expression):
+                raise TypeError(f"Can not combine expression with {expr!r}")
+            if isinstance(expr, Logical) and expr.op == op:
+                children.extend(expr.children)
+            else:
+                children.append(expr)
+        return cls(op, children)
+
+    def compile(self) -> dict[str, typing.Any]:
+        leaves = [c for c in self.children if isinstance(c, Condition)]
+
+        if self.op == "$and" and len(leaves) == len(self.children):
+            keys = {}
+            for leaf in leaves:
+                keys.setdefault(leaf.key, []).append(leaf.op)
+
+            if all(
+                len(ops) == 1 or ("$eq" not in ops and len(set(ops)) == len(ops))
+                for ops in keys.values()
+            ):
+                # Conditions on distinct keys/operators merge into one document
+                query = {}
+                for leaf in leaves:
+                    value = _encode(leaf.value)
+                    if leaf.op == "$eq":
+                        query[leaf.key] = value
+                    else:
+                        query.setdefault(leaf.key, {})[leaf.op] = value
+                return query
+
+        return {self.op: [child.compile() for child in self.children]}
+
+    def __repr__(self) -> str:
+        return f"Logical({self.op!r}, {self.children!r})"
+
+
+class FieldExpression:
+    __slots__ = ("key", "annotation")
+
+    def __init__(self, key: str, annotation: typing.Any = None):
+        self.key = key
+        self.annotation = annotation
+
+    def __getattr__(self, name: str) -> FieldExpression:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        model = _nested_model(self.annotation)
+        field = model.model_fields.get(name) if model is not None else None
+        if field is None:
+            return FieldExpression(f"{self.key}.{name}")
+        return FieldExpression(f"{self.key}.{field.alias or name}", field.annotation)
+
+    def __eq__(self, value: typing.Any) -> Condition:
+        return Condition(self.key, "$eq", value)
+
+    def __ne__(self, value: typing.Any) -> Condition:
+        return Condition(self.key, "$ne", value)
+
+    def __gt__(self, value: typing.Any) -> Condition:
+        return Condition(self.key, "$gt", value)
+
+    def __ge__(self, value: typing.Any) -> Condition:
+        return Condition(self.key, "$gte", value)
+
+    def __lt__(self, value: typing.Any) -> Condition:
+        return Condition(self.key, "$lt", value)
+
+    def __le__(self, value: typing.Any) -> Condition:
+        return Condition(self.key, "$lte", value)
+
+    __hash__ = None
+
+    def in_(self, values: typing.Iterable[typing.Any]) -> Condition:
+        return Condition(self.key, "$in", list(values))
+
+    def not_in(self, values: typing.Iterable[typing.Any]) -> Condition:
+        return Condition(self.key, "$nin", list(values))
+
+    def exists(self, exists: bool = True) -> Condition:
+        return Condition(self.key, "$exists", exists)
+
+    def regex(self, pattern: str) -> Condition:
+        return Condition(self.key, "$regex", pattern)
+
+    def asc(self) -> tuple[str, int]:
+        return self.key, pymongo.ASCENDING
+
+    def desc(self) -> tuple[str, int]:
+        return self.key, pymongo.DESCENDING
+
+    def __repr__(self) -> str:
+        return f"FieldExpression({self.key!r})"
+
+
+def _sort_keys(keys: typing.Iterable[FieldExpression | str | tuple]):
+    result = []
+    for key in keys:
+        if isinstance(key, tuple):
+            key, direction = key
+        else:
+            direction = pymongo.ASCENDING
+        if isinstance(key, FieldExpression):
+            key = key.key
+        result.append((key, direction))
+    return result
+
+
+def _get_path(doc: dict[str, typing.Any], key: str) -> typing.Any:
+    for part in key.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+def _encode_token(keys: list[tuple[str, int]], values: list) -> str:
+    raw = bson.encode({"k": [list(key) for key in keys], "v": values})
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_token(token: str, keys: list[tuple[str, int]]) -> list:
+    try:
+        data = bson.decode(base64.urlsafe_b64decode(token))
+    except (ValueError, bson.errors.BSONError):
+        raise ValueError("Invalid pagination token")
+
+    if [tuple(key) for key in data.get("k", [])] != keys:
+        raise ValueError("Pagination token does not match the sort order")
+    return data["v"]
+
+
+def _keyset_filter(keys: list[tuple[str, int]], values: list) -> dict:
+    # (k1 > v1) or (k1 == v1 and k2 > v2) or ...
+    # Range operators only compare within one type and null sorts first, so
+    # null values get their own clauses.
+    clauses = []
+    for i, (key, direction) in enumerate(keys):
+        value = values[i]
+        clause = {k: v for (k, _), v in zip(keys[:i], values)}
+        if direction == pymongo.ASCENDING:
+            clause[key] = {"$ne": None} if value is None else {"$gt": value}
+        elif value is None:
+            # Nothing sorts after null in descending order
+            continue
+        else:
+            clause["$or"] = [{key: {"$lt": value}}, {key: None}]
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+_operation: contextvars.ContextVar[Operation | None] = contextvars.ContextVar(
+    "morm_operation", default=None
+)
+
+
+def _operation_model(target: typing.Any) -> typing.Type[Model]:
+    if isinstance(target, type):
+        return target
+    if isinstance(target, Model):
+        return type(target)
+    return target.model
+
+
+def _observe(query: typing.Any = None, *documents: typing.Any):
+    operation = _operation.get()
+    if operation is not None:
+        operation.observe(query, *documents)
+
+
+@contextmanager
+def _measure(model: typing.Type[Model], name: str):
+    metrics = model._metrics()
+    if metrics is None or _operation.get() is not None:
+        # Nested operations are accounted to the outermost one
+        yield None
+        return
+
+    operation = Operation(model.__name__, name)
+    token = _operation.set(operation)
+    start = time.perf_counter()
+    try:
+        yield operation
+    except BaseException as e:
+        operation.error = type(e).__name__
+        raise
+    finally:
+        operation.duration = time.perf_counter() - start
+        _operation.reset(token)
+        metrics.record(operation)
+
+
+def _instrumented(name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(target, *args, **kwargs):
+            model = _operation_model(target)
+            if model._metrics() is None:
+                return await func(target, *args, **kwargs)
+
+            with _measure(model, name):
+                return await func(target, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def _measure_iter(
+    iterator: typing.AsyncGenerator, metrics: Metrics, operation: Operation
+) -> typing.AsyncIterator:
+    # Only time spent inside the iterator counts, not the consumer's
+    try:
+        while True:
+            token = _operation.set(operation)
+            start = time.perf_counter()
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                break
+            finally:
+                operation.duration += time.perf_counter() - start
+                _operation.reset(token)
+            yield item
+    except Exception as e:
+        operation.error = type(e).__name__
+        raise
+    finally:
+        await iterator.aclose()
+        metrics.record(operation)
+
+
+def _instrumented_iter(name: str):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(target, *args, **kwargs):
+            iterator = func(target, *args, **kwargs)
+            model = _operation_model(target)
+            metrics = model._metrics()
+            if metrics is None or _operation.get() is not None:
+                return iterator
+
+            return _measure_iter(iterator, metrics, Operation(model.__name__, name))
+
+        return wrapper
+
+    return decorator
+
+
+class Query(typing.Generic[ModelT]):
+    def __init__(self, model: typing.Type[ModelT], where: Expression | None = None):
+        self.model = model
+        self.where = where
+
+        self._sort: list[tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, *keys: FieldExpression | str | tuple) -> typing.Self:
+        self._sort.extend(_sort_keys(keys))
+        return self
+
+    def skip(self, skip: int) -> typing.Self:
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> typing.Self:
+        self._limit = limit
+        return self
+
+    def _apply(self, cursor):
+        if self._sort:
+            cursor.sort(self._sort)
+        if self._skip:
+            cursor.skip(self._skip)
+        if self._limit:
+            cursor.limit(self._limit)
+
+    async def all(self, **kwargs) -> list[ModelT]:
+        return await self.model.get_many(self._apply, _where=self.where, **kwargs)
+
+    async def first(self, **kwargs) -> typing.Optional[ModelT]:
+        limit, self._limit = self._limit, 1
+        try:
+            objs = await self.all(**kwargs)
+        finally:
+            self._limit = limit
+        return objs[0] if objs else None
+
+    @_instrumented("count")
+    async def count(
+        self,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+    ) -> int:
+        kwargs = {}
+        if self._skip:
+            kwargs["skip"] = self._skip
+        if self._limit:
+            kwargs["limit"] = self._limit
+        collection = self.model.collection(
+            read_preference=_read_preference, read_concern=_read_concern
+        )
+        query = self.model._merge_where({}, self.where)
+        _observe(query)
+        with _call_deadline(_timeout):
+            return await collection.count_documents(
+                query, **kwargs, **_session_kwargs()
+            )
+
+    def __aiter__(self) -> typing.AsyncIterator[ModelT]:
+        return self.model.iter(self._apply, _where=self.where).__aiter__()
+
+
+def _stage_value(value: typing.Any) -> typing.Any:
+    if isinstance(value, FieldExpression):
+        return f"${value.key}"
+    if isinstance(value, dict):
+        return {k: _stage_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_stage_value(v) for v in value]
+    return value
+
+
+class Aggregation(typing.Generic[ModelT]):
+    def __init__(self, model: typing.Type[ModelT]):
+        self.model = model
+        self.stages: list[dict[str, typing.Any]] = []
+        self.result_model: typing.Optional[typing.Type[BaseModel]] = None
+
+    def stage(self, stage: dict[str, typing.Any]) -> typing.Self:
+        self.stages.append(stage)
+        return self
+
+    def match(self, *where: Expression, **params) -> typing.Self:
+        fields = self.model.model_fields
+        query = {
+            (fields[k].alias or k) if k in fields else k: _encode(v)
+            for k, v in params.items()
+        }
+        for expr in where:
+            query = self.model._merge_where(query, expr)
+        return self.stage({"$match": query})
+
+    def group(self, _id: typing.Any, **accumulators) -> typing.Self:
+        return self.stage(
+            {"$group": {"_id": _stage_value(_id), **_stage_value(accumulators)}}
+        )
+
+    def project(self, *fields: FieldExpression | str, **spec) -> typing.Self:
+        projection = {
+            field.key if isinstance(field, FieldExpression) else field: 1
+            for field in fields
+        }
+        projection.update(_stage_value(spec))
+        return self.stage({"$project": projection})
+
+    def lookup(
+        self,
+        from_: str | typing.Type[Model],
+        local_field: FieldExpression | str,
+        foreign_field: FieldExpression | str,
+        as_: str,
+    ) -> typing.Self:
+        if isinstance(from_, type) and issubclass(from_, Model):
+            from_ = from_.collection_name()
+        if isinstance(local_field, FieldExpression):
+            local_field = local_field.key
+        if isinstance(foreign_field, FieldExpression):
+            foreign_field = foreign_field.key
+
+        return self.stage(
+            {
+                "$lookup": {
+                    "from": from_,
+                    "localField": local_field,
+                    "foreignField": foreign_field,
+                    "as": as_,
+                }
+            }
+        )
+
+    def unwind(
+        self, path: FieldExpression | str, preserve_null: bool = False
+    ) -> typing.Self:
+        path = _stage_value(path) if isinstance(path, FieldExpression) else path
+        if not path.startswith("$"):
+            path = f"${path}"
+
+        if preserve_null:
+            return self.stage(
+                {"$unwind": {"path": path, "preserveNullAndEmptyArrays": True}}
+            )
+        return self.stage({"$unwind": path})
+
+    def sort(self, *keys: FieldExpression | str | tuple) -> typing.Self:
+        return self.stage({"$sort": dict(_sort_keys(keys))})
+
+    def skip(self, skip: int) -> typing.Self:
+        return self.stage({"$skip": skip})
+
+    def limit(self, limit: int) -> typing.Self:
+        return self.stage({"$limit": limit})
+
+    def facet(self, **pipelines: Aggregation | list) -> typing.Self:
+        return self.stage(
+            {
+                "$facet": {
+                    name: p.stages if isinstance(p, Aggregation) else p
+                    for name, p in pipelines.items()
+                }
+            }
+        )
+
+    def into(self, result_model: typing.Type[BaseModel]) -> typing.Self:
+        self.result_model = result_model
+        return self
+
+    def _result(self, doc: dict[str, typing.Any]) -> typing.Any:
+        result_model = self.result_model
+        if result_model is not None and issubclass(result_model, Model):
+            return result_model._load(doc)
+
+        operation = _operation.get()
+        if operation is not None:
+            operation.documents += 1
+        if result_model is None:
+            return doc
+
+        doc = _codec(result_model).prepare(doc)
+        if operation is None:
+            return result_model.model_validate(doc)
+
+        start = time.perf_counter()
+        result = result_model.model_validate(doc)
+        operation.validation += time.perf_counter() - start
+        return result
+
+    @_instrumented_iter("aggregate")
+    async def iter(
+        self,
+        batch_size: typing.Optional[int] = None,
+        allow_disk_use: typing.Optional[bool] = None,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+    ) -> typing.AsyncIterator[typing.Any]:
+        kwargs = _session_kwargs()
+        if batch_size is not None:
+            kwargs["batchSize"] = batch_size
+        if allow_disk_use is not None:
+            kwargs["allowDiskUse"] = allow_disk_use
+        if _timeout is not None:
+            kwargs["maxTimeMS"] = int(_timeout * 1000)
+
+        collection = self.model.collection(
+            read_preference=_read_preference, read_concern=_read_concern
+        )
+        _observe({"pipeline": self.stages})
+        try:
+            cursor = await collection.aggregate(self.stages, **kwargs)
+            async for doc in cursor:
+                yield self._result(doc)
+        except PyMongoError as e:
+            if _timeout is not None and _is_timeout(e):
+                raise QueryTimeout(_timeout) from e
+            raise
+
+    def __aiter__(self) -> typing.AsyncIterator[typing.Any]:
+        return self.iter().__aiter__()
+
+    async def all(self, **kwargs) -> list[typing.Any]:
+        return [doc async for doc in self.iter(**kwargs)]
+
+
+_defining_model: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "morm_defining_model", default=False
+)
+
+
+def _is_tracked(value: typing.Any) -> bool:
+    return value is None or isinstance(value, (TrackedList, TrackedDict))
+
+
+# Pydantic does not export its metaclass, so take it from BaseModel instead of
+# importing it from a private module
+class ModelMeta(type(BaseModel)):
+    def __new__(mcs, *args, **kwargs):
+        # Pydantic probes class attributes while collecting fields
+        token = _defining_model.set(True)
+        try:
+            return super().__new__(mcs, *args, **kwargs)
+        finally:
+            _defining_model.reset(token)
+
+    def __getattr__(cls, name: str) -> typing.Any:
+        if not _defining_model.get():
+            field = cls.__dict__.get("__pydantic_fields__", {}).get(name)
+            if field is not None:
+                return FieldExpression(field.alias or name, field.annotation)
+        return super().__getattr__(name)
+
 
 class DatabaseException(Exception):
     pass
@@ -60,12 +1245,464 @@ class AlreadyExists(DatabaseException):
         super().__init__("Object of model already exists")
 
 
+class NotLoaded(DatabaseException, AttributeError):
+    def __init__(self, fields: typing.Iterable[str]):
+        self.fields = sorted(fields)
+        super().__init__(f"Fields not loaded: {', '.join(self.fields)}")
+
+
+class FlushError(DatabaseException):
+    def __init__(self, failed: list[tuple[Model, dict]]):
+        super().__init__(f"Failed to flush {len(failed)} object(s) of unit of work")
+        self.failed = failed
+
+
+class QueryTimeout(DatabaseException, TimeoutError):
+    def __init__(self, seconds: typing.Optional[float] = None):
+        self.seconds = seconds
+        if seconds is None:
+            super().__init__("Operation exceeded its deadline")
+        else:
+            super().__init__(f"Operation exceeded its deadline of {seconds}s")
+
+
+def _is_timeout(e: BaseException) -> bool:
+    return isinstance(e, PyMongoError) and e.timeout
+
+
+class _Deadline:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self._timeout = None
+
+    def __enter__(self) -> typing.Self:
+        # pymongo keeps the earliest deadline and sends the remaining time as
+        # maxTimeMS with every command, writes included
+        self._timeout = pymongo.timeout(self.seconds)
+        self._timeout.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._timeout.__exit__(exc_type, exc, tb)
+        if exc is not None and _is_timeout(exc):
+            raise QueryTimeout(self.seconds) from exc
+
+    async def __aenter__(self) -> typing.Self:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def deadline(seconds: float) -> _Deadline:
+    return _Deadline(seconds)
+
+
+def _call_deadline(seconds: typing.Optional[float]):
+    return nullcontext() if seconds is None else _Deadline(seconds)
+
+
+_unit_of_work: contextvars.ContextVar[UnitOfWork | None] = contextvars.ContextVar(
+    "morm_unit_of_work", default=None
+)
+
+_session: contextvars.ContextVar[AsyncClientSession | None] = contextvars.ContextVar(
+    "morm_session", default=None
+)
+
+
+def _session_kwargs() -> dict[str, typing.Any]:
+    session = _session.get()
+    return {"session": session} if session is not None else {}
+
+
+_evictions: contextvars.ContextVar[list | None] = contextvars.ContextVar(
+    "morm_evictions", default=None
+)
+
+
+async def _evict(cache: Cache, keys: typing.Optional[set[str]]):
+    cache.generation += 1
+
+    # No keys clears the whole cache
+    if keys is None:
+        await cache.clear()
+    else:
+        await cache.delete(*keys)
+
+    evictions = _evictions.get()
+    if evictions is not None:
+        evictions.append((cache, keys))
+
+
+_loading_document: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "morm_loading_document", default=False
+)
+
+
+def _write_errors(
+    e: BulkWriteError, size: int, ordered: bool
+) -> dict[int, dict | None]:
+    errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+    if ordered and errors:
+        first = min(errors)
+        errors.update({i: None for i in range(first + 1, size)})
+    return errors
+
+
+class BatchLoader:
+    def __init__(self, model: typing.Type[Model], field: str):
+        self.model = model
+        self.field = field
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._pending: dict[typing.Any, list[asyncio.Future]] = {}
+
+    def load(self, value: typing.Any) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if not self._pending or self._loop is not loop:
+            self._loop = loop
+            self._pending = {}
+            loop.call_soon(lambda: loop.create_task(self.dispatch()))
+
+        self._pending.setdefault(value, []).append(future)
+        return future
+
+    async def dispatch(self):
+        pending, self._pending = self._pending, {}
+
+        try:
+            cursor = self.model.collection().find({self.field: {"$in": list(pending)}})
+            docs = {}
+            async for doc in cursor:
+                docs.setdefault(doc.get(self.field), doc)
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for value, futures in pending.items():
+            doc = docs.get(value)
+            for i, future in enumerate(futures):
+                if future.done():
+                    continue
+                if doc is None:
+                    future.set_exception(DoesNotExist())
+                else:
+                    # Every caller builds its own instance from the document
+                    future.set_result(doc if i == 0 else copy.deepcopy(doc))
+
+
+_loaders: dict[tuple[typing.Type[Model], str], BatchLoader] = {}
+
+
+@functools.cache
+def _batch_fields(model_cls: typing.Type[Model]) -> frozenset[str]:
+    # Results are matched back by value, which only holds for fields whose
+    # stored value equals the queried one: no dotted paths and no arrays
+    kinds = _field_kinds(model_cls)
+    fields = {"_id"}
+    for name, field in model_cls.model_fields.items():
+        key = field.alias or name
+        if kinds.get(name) in ("scalar", "reference") and (key,) in (
+            model_cls._unique_keys()
+        ):
+            fields.add(key)
+    return frozenset(fields)
+
+
+class IdentityMap:
+    def __init__(self):
+        self._objects: dict[tuple[typing.Type[Model], typing.Any], Model] = {}
+
+    def get(self, model: typing.Type[Model], _id: typing.Any) -> Model | None:
+        return self._objects.get((model, _id))
+
+    def add(self, obj: Model) -> Model:
+        if obj.id is not None:
+            return self._objects.setdefault((type(obj), obj.id), obj)
+        return obj
+
+    def remove(self, obj: Model):
+        self._objects.pop((type(obj), obj.id), None)
+
+    def clear(self, model: typing.Optional[typing.Type[Model]] = None):
+        if model is None:
+            self._objects.clear()
+        else:
+            for key in [key for key in self._objects if key[0] is model]:
+                del self._objects[key]
+
+
+_identity_map: contextvars.ContextVar[IdentityMap | None] = contextvars.ContextVar(
+    "morm_identity_map", default=None
+)
+
+
+class UnitOfWork:
+    def __init__(self, ordered: bool = False):
+        self.ordered = ordered
+
+        self._tracked: dict[int, Model] = {}
+        self._deleted: dict[int, Model] = {}
+
+    def add(self, obj: Model) -> Model:
+        self._deleted.pop(id(obj), None)
+        self._tracked[id(obj)] = obj
+        return obj
+
+    def delete(self, obj: Model):
+        if not obj.id:
+            raise DoesNotExist
+
+        self._tracked.pop(id(obj), None)
+        self._deleted[id(obj)] = obj
+
+    def _collect(self) -> dict[typing.Type[Model], list]:
+        groups = {}
+
+        for obj in self._tracked.values():
+            if obj.id is None:
+                data = obj._make_dump()
+                doc = {"_id": bson.ObjectId(), **data}
+
+                def on_success(obj=obj, doc=doc, data=data):
+                    obj.id = doc["_id"]
+                    obj._take_snapshot(data)
+
+                op = pymongo.InsertOne(doc)
+                sent = (doc,)
+            else:
+                state = obj._dirty_state()
+                update = obj._get_update(state)
+                if not update:
+                    continue
+
+                on_success = functools.partial(obj._commit_state, state)
+                op = pymongo.UpdateOne({"_id": obj.id}, update)
+                sent = ({"_id": obj.id}, update)
+
+            groups.setdefault(type(obj), []).append((op, obj, on_success, sent))
+
+        for obj in self._deleted.values():
+
+            def on_success(obj=obj):
+                obj.id = None
+
+            op = pymongo.DeleteOne({"_id": obj.id})
+            sent = ({"_id": obj.id},)
+            groups.setdefault(type(obj), []).append((op, obj, on_success, sent))
+
+        return groups
+
+    async def flush(self) -> list[tuple[Model, dict | None]]:
+        failed = []
+
+        for model, entries in self._collect().items():
+            errors = {}
+            with _measure(model, "bulk") as operation:
+                if operation is not None:
+                    operation.observe(None, *(d for *_, sent in entries for d in sent))
+                try:
+                    await model.collection().bulk_write(
+                        [op for op, *_ in entries],
+                        ordered=self.ordered,
+                        **_session_kwargs(),
+                    )
+                except BulkWriteError as e:
+                    errors = _write_errors(e, len(entries), self.ordered)
+
+            for i, (_, obj, on_success, _) in enumerate(entries):
+                if i in errors:
+                    failed.append((obj, errors[i]))
+                    continue
+
+                if obj.id is not None:
+                    await obj._invalidate()
+                on_success()
+
+        self._tracked.clear()
+        self._deleted.clear()
+
+        return failed
+
+
+def _is_transient(e: Exception) -> bool:
+    return isinstance(e, ConnectionFailure) or (
+        isinstance(e, PyMongoError) and e.has_error_label("RetryableWriteError")
+    )
+
+
+class Writer:
+    def __init__(
+        self,
+        model: typing.Type[Model],
+        max_batch: int = 500,
+        max_delay_ms: float = 50,
+        max_queue: int = 10_000,
+        retries: int = 3,
+        write_concern: typing.Optional[WriteConcern] = None,
+    ):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.retries = retries
+        self.write_concern = write_concern
+        self.failed: list[tuple[Model, typing.Any]] = []
+
+        self._queue: asyncio.Queue[Model] = asyncio.Queue(max_queue)
+        self._task: asyncio.Task | None = None
+        self._closed = False
+
+    def _start(self):
+        if self._closed:
+            raise RuntimeError("Writer is closed")
+
+        if self._task is None or self._task.done():
+            # Flushes must not join the caller's transaction or unit of work
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(), context=contextvars.Context()
+            )
+
+    async def put(self, obj: Model):
+        if obj.id:
+            raise AlreadyExists
+
+        self._start()
+        await self._queue.put(obj)
+
+    def put_nowait(self, obj: Model):
+        if obj.id:
+            raise AlreadyExists
+
+        self._start()
+        self._queue.put_nowait(obj)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._write(batch)
+            except Exception as e:
+                logger.exception("Failed to write %d buffered object(s)", len(batch))
+                self.failed.extend((obj, e) for obj in batch if obj.id is None)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _write(self, batch: list[Model]):
+        with _measure(self.model, "writer") as operation:
+            await self._insert(batch, operation)
+
+    async def _insert(self, batch: list[Model], operation: Operation | None):
+        snapshots = [obj._make_dump() for obj in batch]
+        docs = [{"_id": bson.ObjectId(), **data} for data in snapshots]
+        if operation is not None:
+            operation.observe(None, *docs)
+
+        pending = list(range(len(batch)))
+        attempt = 0
+        while pending:
+            errors = {}
+            try:
+                collection = self.model.collection(write_concern=self.write_concern)
+                await collection.insert_many([docs[i] for i in pending], ordered=False)
+            except BulkWriteError as e:
+                errors = _write_errors(e, len(pending), False)
+            except PyMongoError as e:
+                if attempt >= self.retries or not _is_transient(e):
+                    raise
+                attempt += 1
+                await asyncio.sleep(min(0.05 * 2**attempt, 1.0))
+                continue
+
+            for j, i in enumerate(pending):
+                error = errors.get(j)
+                # Documents keep their _id between attempts, so a duplicate _id
+                # on a retry means an earlier attempt already wrote it.
+                if error is not None and not (
+                    attempt
+                    and error.get("code") == 11000
+                    and "_id" in (error.get("keyPattern") or {})
+                ):
+                    self.failed.append((batch[i], error))
+                    continue
+
+                batch[i].id = docs[i]["_id"]
+                batch[i]._take_snapshot(snapshots[i])
+            pending = []
+
+    async def flush(self):
+        await self._queue.join()
+
+    async def close(self):
+        self._closed = True
+        if self._task is not None:
+            await self.flush()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        writers = _writers.get(self.model)
+        if writers is not None and self in writers:
+            writers.remove(self)
+
+        if self.failed:
+            logger.warning(
+                "%d object(s) of %s failed to write",
+                len(self.failed),
+                self.model.__name__,
+            )
+
+    async def __aenter__(self) -> typing.Self:
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+_writers: dict[typing.Type[Model], list[Writer]] = {}
+
+
 class Database:
-    def __init__(self, *args, name: typing.Optional[str] = None, **kwargs):
+    def __init__(
+        self,
+        *args,
+        name: typing.Optional[str] = None,
+        metrics: typing.Optional[Metrics] = None,
+        **kwargs,
+    ):
         self.client = pymongo.AsyncMongoClient(*args, **kwargs)
         self.db = self.client.get_database(name)
+        self.metrics = metrics
 
         self._jobs = []
+        self._models = []
         self._grid_fs = None
 
     def __call__(self, cls: typing.Type[Model]):
@@ -73,29 +1710,116 @@ class Database:
             raise TypeError("Provided class must be subclass of Model")
 
         cls._db = self.db
-        for i in cls.indexes():
-            self.register_job(i.create_index(cls))
+        cls._database = self
+        self._models.append(cls)
 
         return cls
 
-    async def setup(self):
+    async def setup(self, concurrency: int = 8) -> dict[str, list[str]]:
         for coro in self._jobs:
             await coro
 
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def setup_model(model: typing.Type[Model]):
+            async with semaphore:
+                return await self.setup_indexes(model)
+
+        models = [model for model in self._models if model.indexes()]
+        results = await asyncio.gather(*(setup_model(model) for model in models))
+
+        drift = {}
+        for model, extra in zip(models, results):
+            if extra:
+                logger.warning(
+                    "Collection %r has indexes not declared in %s.Meta.INDEXES: %s",
+                    model.collection_name(),
+                    model.__name__,
+                    ", ".join(extra),
+                )
+                drift[model.collection_name()] = extra
+
+        return drift
+
+    @staticmethod
+    async def setup_indexes(model: typing.Type[Model]) -> list[str]:
+        existing = await model.collection().index_information()
+
+        wanted = [index.model() for index in model.indexes()]
+        missing = [i for i in wanted if not Index.matches(i, existing)]
+        if missing:
+            await model.collection().create_indexes(missing)
+
+        names = {i.document["name"] for i in wanted} | {"_id_"}
+        return [name for name in existing if name not in names]
+
+    async def close(self):
+        for model in self._models:
+            for writer in list(_writers.get(model, ())):
+                await writer.close()
+
+        await self.client.close()
+
     def register_job(self, coro: typing.Coroutine):
         self._jobs.append(coro)
 
     @asynccontextmanager
     async def transaction(self):
+        evictions = []
         async with self.client.start_session() as s:
             async with await s.start_transaction():
-                yield
+                token = _session.set(s)
+                evictions_token = _evictions.set(evictions)
+                try:
+                    yield s
+                finally:
+                    _evictions.reset(evictions_token)
+                    _session.reset(token)
+
+        # Readers outside the transaction may have re-cached the old documents
+        # before the commit
+        for cache, keys in evictions:
+            await _evict(cache, keys)
+
+    @asynccontextmanager
+    async def scope(self):
+        identity_map = IdentityMap()
+        token = _identity_map.set(identity_map)
+        try:
+            yield identity_map
+        finally:
+            _identity_map.reset(token)
+
+    @asynccontextmanager
+    async def unit_of_work(self, ordered: bool = False):
+        uow = UnitOfWork(ordered=ordered)
+        token = _unit_of_work.set(uow)
+        try:
+            yield uow
+        finally:
+            _unit_of_work.reset(token)
+
+        failed = await uow.flush()
+        if failed:
+            raise FlushError(failed)
+
+    def atomic(self, func=None, *, retries: int = 3):
+        if func is None:
+            return functools.partial(self.atomic, retries=retries)
 
-    def atomic(self, func):
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            async with self.transaction():
-                return await func(*args, **kwargs)
+            attempt = 0
+            while True:
+                try:
+                    async with self.transaction():
+                        return await func(*args, **kwargs)
+                except PyMongoError as e:
+                    if attempt >= retries or not e.has_error_label(
+                        "TransientTransactionError"
+                    ):
+                        raise
+                    attempt += 1
 
         return wrapper
 
@@ -117,18 +1841,62 @@ class Index:
     async def create_index(self, model: Model):
         await model.collection().create_index(self.indexes, **self.params)
 
+    def keys(self) -> list[tuple[str, typing.Any]]:
+        if isinstance(self.indexes, str):
+            return [(self.indexes, pymongo.ASCENDING)]
+        return [
+            (key, pymongo.ASCENDING) if isinstance(key, str) else tuple(key)
+            for key in self.indexes
+        ]
+
+    def covers_sort(self, keys: list[tuple[str, int]]) -> bool:
+        index_keys = self.keys()[: len(keys)]
+        if len(index_keys) < len(keys):
+            return False
+
+        # An index can be walked in either direction
+        reverse = [(key, -direction) for key, direction in keys]
+        return index_keys in (keys, reverse)
+
+    def model(self) -> pymongo.IndexModel:
+        return pymongo.IndexModel(self.indexes, **self.params)
+
+    @staticmethod
+    def matches(index: pymongo.IndexModel, existing: dict[str, dict]) -> bool:
+        spec = index.document
+        info = existing.get(spec["name"])
+        if info is None or list(info["key"]) != list(spec["key"].items()):
+            return False
+
+        return all(
+            info.get(k) == v for k, v in spec.items() if k not in ("key", "name")
+        )
+
 
-class Model(BaseModel):
+class Model(BaseModel, metaclass=ModelMeta):
     class Meta:
         COLLECTION_NAME: str
         INDEXES: list[Index]
+        TRUSTED_LOAD: bool
+        TRUSTED_SAMPLE_RATE: float
+        CACHE: Cache
+        BATCH_LOAD: bool
+        WRITE_CONCERN: WriteConcern
+        READ_PREFERENCE: _ReadPreference
+        READ_CONCERN: ReadConcern
 
     _db: typing.ClassVar[AsyncDatabase]
+    _database: typing.ClassVar[Database]
     _collection: typing.ClassVar[AsyncCollection]
+    _collections: typing.ClassVar[dict[tuple, AsyncCollection]]
+    _raw_collection: typing.ClassVar[AsyncCollection]
 
     _base_model: typing.ClassVar[typing.Type[BaseModel]]
 
     _state_snapshot: typing.Optional[dict[str, typing.Any]] = PrivateAttr(default=None)
+    _dirty_fields: set[str] = PrivateAttr(default_factory=set)
+    _unloaded: frozenset[str] = PrivateAttr(default=frozenset())
+    _lazy_source: typing.Optional[tuple] = PrivateAttr(default=None)
 
     id: typing.Optional[ObjectId] = Field(alias="_id", default=None)
 
@@ -137,19 +1905,491 @@ class Model(BaseModel):
         arbitrary_types_allowed=True,
     )
 
-    def __init__(self, **kwargs) -> None:
-        super().__init__(**kwargs)
-        self._take_snapshot()
+    def model_post_init(self, context: typing.Any) -> None:
+        self._track_containers()
+
+        if self.id is not None and not _loading_document.get():
+            self._take_snapshot()
+
+    def __getattr__(self, name: str) -> typing.Any:
+        if name[:1] == "_":
+            # Private attributes are read on every hot path
+            try:
+                private = object.__getattribute__(self, "__pydantic_private__")
+            except AttributeError:
+                private = None
+            if private is not None and name in private:
+                return private[name]
+            return super().__getattr__(name)
+
+        if name in self._unloaded:
+            if self._materialize(name):
+                return self.__dict__[name]
+            raise NotLoaded([name])
+        return super().__getattr__(name)
+
+    def _materialize(self, name: str) -> bool:
+        source = self._lazy_source
+        if source is None:
+            return False
+
+        raw, validate, projected, codec_options = source
+        if name in projected:
+            return False
+
+        cls = type(self)
+        field = cls.model_fields[name]
+        key = field.alias or name
+
+        if key in raw:
+            value = _inflate(raw[key], codec_options)
+            if validate:
+                cls.__pydantic_validator__.validate_assignment(
+                    self, name, _codec(cls).prepare_field(name, value)
+                )
+            else:
+                self.__dict__[name] = _codec(cls).decode_field(name, value)
+            self._state_snapshot[key] = _inflate(raw[key], codec_options)
+        elif field.is_required():
+            return False
+        else:
+            self.__dict__[name] = field.get_default(call_default_factory=True)
+
+        kind = _field_kinds(cls)[name]
+        if kind in ("list", "dict"):
+            self._track_container(name, kind)
+
+        self._unloaded = self._unloaded - {name}
+        if not self._unloaded:
+            # Fields were read in any order, restore declaration order for repr
+            values = dict(self.__dict__)
+            self.__dict__.clear()
+            self.__dict__.update(
+                (name, values[name]) for name in cls.model_fields if name in values
+            )
+            self._lazy_source = None
+        return True
+
+    def _materialize_all(self):
+        for name in self._unloaded:
+            self._materialize(name)
+
+    def _require_loaded(self):
+        self._materialize_all()
+        if self._unloaded:
+            raise NotLoaded(self._unloaded)
+
+    def _require_dumped(self, include: typing.Any, exclude: typing.Any):
+        self._materialize_all()
+        missing = self._unloaded
+        if missing and include is not None:
+            missing = missing & set(include)
+        if missing and exclude is not None:
+            missing = missing - set(exclude)
+        if missing:
+            # Dumping would silently fill or drop fields that were projected out
+            raise NotLoaded(missing)
+
+    def model_dump(self, **kwargs) -> dict[str, typing.Any]:
+        self._require_dumped(kwargs.get("include"), kwargs.get("exclude"))
+        return super().model_dump(**kwargs)
+
+    def model_dump_json(self, **kwargs) -> str:
+        self._require_dumped(kwargs.get("include"), kwargs.get("exclude"))
+        return super().model_dump_json(**kwargs)
+
+    def __repr_args__(self):
+        self._materialize_all()
+        return super().__repr_args__()
+
+    def __eq__(self, other: typing.Any) -> bool:
+        if not isinstance(other, Model):
+            return super().__eq__(other)
+
+        self._materialize_all()
+        other._materialize_all()
+        # Private attributes only hold change tracking state
+        return (
+            type(self) is type(other)
+            and self.__dict__ == other.__dict__
+            and self.__pydantic_extra__ == other.__pydantic_extra__
+        )
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        kind = _field_kinds(type(self)).get(name)
+        if kind is not None and name not in self.__dict__:
+            # Assigning a field that was projected out loads it
+            self._unloaded = self._unloaded - {name}
 
-    def _make_dump(self):
-        return self.model_dump(by_alias=True, exclude={"id"})
+        if kind == "reference":
+            type(self).__pydantic_validator__.validate_assignment(self, name, value)
+        else:
+            super().__setattr__(name, value)
+
+        if kind is not None:
+            self._dirty_fields.add(name)
+            if kind in ("list", "dict"):
+                self._track_container(name, kind)
+
+    def __copy__(self) -> typing.Self:
+        obj = super().__copy__()
+        # Saving either object must not mark the other one as saved
+        obj._dirty_fields = set(self._dirty_fields)
+        if self._state_snapshot is not None:
+            obj._state_snapshot = dict(self._state_snapshot)
+        obj._track_containers()
+        return obj
+
+    def __deepcopy__(self, memo: typing.Optional[dict] = None) -> typing.Self:
+        obj = super().__deepcopy__(memo)
+        obj._track_containers()
+        return obj
+
+    def __setstate__(self, state: dict[typing.Any, typing.Any]) -> None:
+        super().__setstate__(state)
+        self._track_containers()
+
+    def _track_containers(self):
+        for name, kind in _field_kinds(type(self)).items():
+            if kind in ("list", "dict"):
+                self._track_container(name, kind)
+
+    def _track_container(self, name: str, kind: str):
+        value = self.__dict__.get(name)
+        on_change = functools.partial(self._dirty_fields.add, name)
+
+        if kind == "list" and isinstance(value, list):
+            self.__dict__[name] = TrackedList(value, on_change)
+        elif kind == "dict" and isinstance(value, dict):
+            self.__dict__[name] = TrackedDict(value, on_change)
 
-    def _take_snapshot(self):
-        self._state_snapshot = self._make_dump()
+    def _make_dump(self):
+        codec = _codec(type(self))
+        return codec.encode(self, codec.document_fields)
+
+    def _take_snapshot(self, data: typing.Optional[dict[str, typing.Any]] = None):
+        self._state_snapshot = data if data is not None else self._make_dump()
+        self._dirty_fields.clear()
+
+    def _dirty_state(self) -> dict[str, typing.Any]:
+        if self._state_snapshot is None:
+            return self._make_dump()
+
+        dirty = self._dirty_fields
+        values = self.__dict__
+        include = {
+            name
+            for name, kind in _field_kinds(type(self)).items()
+            if kind == "opaque"
+            or name in dirty
+            # Containers that were never wrapped (e.g. model_post_init without
+            # super()) can not report changes and are diffed like opaque fields
+            or (kind in ("list", "dict") and not _is_tracked(values.get(name)))
+        }
+        include -= self._unloaded
+        if not include:
+            return {}
+
+        return _codec(type(self)).encode(self, include)
+
+    def _commit_state(self, state: dict[str, typing.Any]):
+        if self._state_snapshot is None:
+            self._state_snapshot = state
+        else:
+            self._state_snapshot.update(state)
+        self._dirty_fields.clear()
+
+    def _refresh(self, doc: dict[str, typing.Any]):
+        cls = type(self)
+        kinds = _field_kinds(cls)
+        names = {field.alias or name: name for name, field in cls.model_fields.items()}
+
+        refreshed = set()
+        for key, value in doc.items():
+            name = names.get(key)
+            if name is None or name == "id":
+                continue
+
+            cls.__pydantic_validator__.validate_assignment(self, name, value)
+            if kinds[name] in ("list", "dict"):
+                self._track_container(name, kinds[name])
+            refreshed.add(name)
+
+        if self._unloaded:
+            self._unloaded = self._unloaded - refreshed
+
+        if self._state_snapshot is None:
+            self._take_snapshot()
+        elif refreshed:
+            self._state_snapshot.update(_codec(cls).encode(self, refreshed))
+        self._dirty_fields.difference_update(refreshed)
 
     def _get_state_diff(self):
-        state = self._make_dump()
-        return recursive_diff(self._state_snapshot, state)
+        return recursive_diff(self._state_snapshot, self._dirty_state())
+
+    def _get_update(
+        self, state: typing.Optional[dict[str, typing.Any]] = None
+    ) -> dict[str, dict[str, typing.Any]]:
+        if state is None:
+            state = self._dirty_state()
+
+        return update_diff(self._state_snapshot, state, _field_keys(type(self)))
+
+    @classmethod
+    def _projection(
+        cls,
+        only: typing.Optional[typing.Iterable[str]] = None,
+        exclude: typing.Optional[typing.Iterable[str]] = None,
+    ) -> tuple[typing.Optional[dict[str, int]], frozenset[str]]:
+        if only is None and exclude is None:
+            return None, frozenset()
+        if only is not None and exclude is not None:
+            raise ValueError("only and exclude are mutually exclusive")
+
+        fields = cls.model_fields
+        names = set(only if only is not None else exclude)
+        unknown = names - fields.keys()
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+        if only is not None:
+            projection = {"_id": 1}
+            projection.update({fields[name].alias or name: 1 for name in names})
+            return projection, frozenset(fields.keys() - names - {"id"})
+
+        if "id" in names:
+            raise ValueError("id can not be excluded")
+        return {fields[name].alias or name: 0 for name in names}, frozenset(names)
+
+    @classmethod
+    def _construct_partial(
+        cls, doc: dict[str, typing.Any], unloaded: frozenset[str], validate: bool
+    ) -> typing.Self:
+        obj = cls.model_construct()
+        for name in unloaded:
+            obj.__dict__.pop(name, None)
+
+        validator = cls.__pydantic_validator__
+        codec = _codec(cls)
+        for name, field in cls.model_fields.items():
+            key = field.alias or name
+            if name in unloaded or key not in doc:
+                continue
+
+            if validate:
+                validator.validate_assignment(
+                    obj, name, codec.prepare_field(name, doc[key])
+                )
+            else:
+                obj.__dict__[name] = codec.decode_field(name, doc[key])
+
+        for name, kind in _field_kinds(cls).items():
+            if kind in ("list", "dict") and name not in unloaded:
+                obj._track_container(name, kind)
+
+        obj._unloaded = unloaded
+        return obj
+
+    @classmethod
+    def _construct_lazy(
+        cls, raw: RawBSONDocument, validate: bool, projected: frozenset[str]
+    ) -> typing.Self:
+        # Fields are only decoded and validated when first read
+        token = _loading_document.set(True)
+        try:
+            obj = _codec(cls).instantiate({"id": raw.get("_id")})
+        finally:
+            _loading_document.reset(token)
+
+        obj._unloaded = _codec(cls).document_fields
+        obj._lazy_source = (
+            raw,
+            validate,
+            projected,
+            cls.collection().codec_options,
+        )
+        obj._take_snapshot({})
+        return obj
+
+    @classmethod
+    def _from_document(
+        cls,
+        doc: dict[str, typing.Any],
+        trusted: typing.Optional[bool] = None,
+        unloaded: frozenset[str] = frozenset(),
+    ) -> typing.Self:
+        if trusted is None:
+            trusted = getattr(cls.Meta, "TRUSTED_LOAD", False)
+
+        sample_rate = getattr(cls.Meta, "TRUSTED_SAMPLE_RATE", 0.0)
+        validate = not trusted or (sample_rate and random.random() < sample_rate)
+
+        if isinstance(doc, RawBSONDocument):
+            return cls._construct_lazy(doc, validate, unloaded)
+
+        token = _loading_document.set(True)
+        try:
+            if unloaded:
+                obj = cls._construct_partial(doc, unloaded, validate)
+            elif validate:
+                obj = cls.model_validate(_codec(cls).prepare(doc))
+            else:
+                obj = _construct_model(cls, doc)
+        finally:
+            _loading_document.reset(token)
+
+        if validate and not _validation_copies(cls):
+            obj._take_snapshot()
+            return obj
+
+        # The instance owns its own containers, so the received document
+        # can serve as the snapshot without dumping the model again.
+        doc.pop("_id", None)
+        obj._take_snapshot(doc)
+        return obj
+
+    @classmethod
+    def _track(cls, obj: typing.Self) -> typing.Self:
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            obj = identity_map.add(obj)
+
+        uow = _unit_of_work.get()
+        if uow is not None:
+            uow.add(obj)
+        return obj
+
+    @classmethod
+    def _batch_loader(
+        cls, params: dict[str, typing.Any]
+    ) -> typing.Optional[BatchLoader]:
+        if not getattr(cls.Meta, "BATCH_LOAD", False) or _session.get() is not None:
+            return None
+        if len(params) != 1:
+            return None
+
+        field, value = next(iter(params.items()))
+        if field not in _batch_fields(cls) or isinstance(value, (dict, list)):
+            return None
+
+        loader = _loaders.get((cls, field))
+        if loader is None:
+            loader = _loaders[(cls, field)] = BatchLoader(cls, field)
+        return loader
+
+    @classmethod
+    def _cache(cls) -> typing.Optional[Cache]:
+        return getattr(cls.Meta, "CACHE", None)
+
+    @classmethod
+    def _unique_keys(cls) -> list[tuple[str, ...]]:
+        keys = [("_id",)]
+        for index in cls.indexes():
+            if index.params.get("unique"):
+                fields = index.indexes
+                if isinstance(fields, str):
+                    fields = [fields]
+                keys.append(
+                    tuple(sorted(f if isinstance(f, str) else f[0] for f in fields))
+                )
+        return keys
+
+    @classmethod
+    def _cache_key(cls, params: dict[str, typing.Any]) -> typing.Optional[str]:
+        if tuple(sorted(params)) not in cls._unique_keys():
+            return None
+        if any(isinstance(v, (dict, list)) for v in params.values()):
+            return None
+
+        lookup = "&".join(f"{k}={params[k]!r}" for k in sorted(params))
+        return f"{cls.collection_name()}:{lookup}"
+
+    async def _invalidate(self):
+        cache = type(self)._cache()
+        if cache is None:
+            return
+
+        unique_keys = self._unique_keys()
+        fields = {field for key in unique_keys for field in key}
+        include = {
+            name
+            for name, field in type(self).model_fields.items()
+            if (field.alias or name) in fields and name != "id"
+        }
+
+        if include & self._unloaded:
+            for name in include & self._unloaded:
+                self._materialize(name)
+            if include & self._unloaded:
+                # Unique values that were projected out are unknown
+                await _evict(cache, None)
+                return
+
+        sources = [{**_codec(type(self)).encode(self, include), "_id": self.id}]
+        if self._state_snapshot is not None:
+            sources.append({**self._state_snapshot, "_id": self.id})
+
+        keys = set()
+        for unique in unique_keys:
+            for source in sources:
+                if all(field in source for field in unique):
+                    key = self._cache_key({field: source[field] for field in unique})
+                    if key is not None:
+                        keys.add(key)
+
+        if keys:
+            await _evict(cache, keys)
+
+    @classmethod
+    async def _invalidate_all(cls):
+        cache = cls._cache()
+        if cache is not None:
+            await _evict(cache, None)
+
+    @classmethod
+    def _load(
+        cls,
+        doc: dict[str, typing.Any],
+        trusted: typing.Optional[bool] = None,
+        refresh: bool = False,
+        unloaded: frozenset[str] = frozenset(),
+    ) -> typing.Self:
+        operation = _operation.get()
+        if operation is not None:
+            operation.documents += 1
+
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            obj = identity_map.get(cls, doc.get("_id"))
+            if obj is not None:
+                if refresh or obj._unloaded - unloaded:
+                    if isinstance(doc, RawBSONDocument):
+                        doc = bson.decode(doc.raw, cls.collection().codec_options)
+                    obj._refresh(doc)
+                return cls._track(obj)
+
+        operation = _operation.get()
+        if operation is None:
+            return cls._track(cls._from_document(doc, trusted, unloaded))
+
+        start = time.perf_counter()
+        obj = cls._from_document(doc, trusted, unloaded)
+        operation.validation += time.perf_counter() - start
+        return cls._track(obj)
+
+    @classmethod
+    def _forget(cls, obj: typing.Optional[typing.Self] = None):
+        identity_map = _identity_map.get()
+        if identity_map is not None:
+            if obj is None:
+                identity_map.clear(cls)
+            else:
+                identity_map.remove(obj)
+
+    @classmethod
+    def _metrics(cls) -> typing.Optional[Metrics]:
+        database = getattr(cls, "_database", None)
+        return database.metrics if database is not None else None
 
     @classmethod
     def collection_name(cls) -> str:
@@ -163,11 +2403,71 @@ class Model(BaseModel):
         raise RuntimeError("No Database connected!")
 
     @classmethod
-    def collection(cls) -> AsyncCollection:
+    def _with_options(
+        cls, collection: AsyncCollection, raw: bool, **options
+    ) -> AsyncCollection:
+        meta = {
+            "write_concern": "WRITE_CONCERN",
+            "read_preference": "READ_PREFERENCE",
+            "read_concern": "READ_CONCERN",
+        }
+        for name, option in meta.items():
+            if options.get(name) is None:
+                options[name] = getattr(cls.Meta, option, None)
+
+        options = {k: v for k, v in options.items() if v is not None}
+        if not options:
+            return collection
+
+        if not hasattr(cls, "_collections"):
+            cls._collections = {}
+
+        # Option objects are not hashable, their reprs are stable
+        key = (raw, *((k, repr(v)) for k, v in options.items()))
+        handle = cls._collections.get(key)
+        if handle is None:
+            handle = cls._collections[key] = collection.with_options(**options)
+
+        return handle
+
+    @classmethod
+    def collection(
+        cls,
+        write_concern: typing.Optional[WriteConcern] = None,
+        read_preference: typing.Optional[_ReadPreference] = None,
+        read_concern: typing.Optional[ReadConcern] = None,
+    ) -> AsyncCollection:
         if not hasattr(cls, "_collection"):
             cls._collection = cls.db().get_collection(cls.collection_name())
 
-        return cls._collection
+        return cls._with_options(
+            cls._collection,
+            False,
+            write_concern=write_concern,
+            read_preference=read_preference,
+            read_concern=read_concern,
+        )
+
+    @classmethod
+    def raw_collection(
+        cls,
+        read_preference: typing.Optional[_ReadPreference] = None,
+        read_concern: typing.Optional[ReadConcern] = None,
+    ) -> AsyncCollection:
+        if not hasattr(cls, "_raw_collection"):
+            cls.collection()
+            collection = cls._collection
+            codec_options = collection.codec_options.with_options(
+                document_class=RawBSONDocument
+            )
+            cls._raw_collection = collection.with_options(codec_options=codec_options)
+
+        return cls._with_options(
+            cls._raw_collection,
+            True,
+            read_preference=read_preference,
+            read_concern=read_concern,
+        )
 
     @classmethod
     def indexes(cls):
@@ -209,98 +2509,640 @@ class Model(BaseModel):
         return self.id.__hash__()
 
     @classmethod
-    async def get(cls, **params) -> typing.Optional[typing.Self]:
-        _id = params.pop("id", None)
+    def writer(
+        cls,
+        max_batch: int = 500,
+        max_delay_ms: float = 50,
+        max_queue: int = 10_000,
+        retries: int = 3,
+        write_concern: typing.Optional[WriteConcern] = None,
+    ) -> Writer:
+        writer = Writer(cls, max_batch, max_delay_ms, max_queue, retries, write_concern)
+        _writers.setdefault(cls, []).append(writer)
+        return writer
 
-        if _id is not None:
-            params["_id"] = _id
+    @classmethod
+    def aggregate(cls) -> Aggregation[typing.Self]:
+        return Aggregation(cls)
 
-        obj = await cls.collection().find_one(params)
-        if not obj:
-            raise DoesNotExist
+    @classmethod
+    def query(cls, *where: Expression) -> Query[typing.Self]:
+        if len(where) > 1:
+            return Query(cls, Logical.combine("$and", *where))
+        return Query(cls, where[0] if where else None)
+
+    @staticmethod
+    def _merge_where(
+        params: dict[str, typing.Any], where: typing.Optional[Expression]
+    ) -> dict[str, typing.Any]:
+        if where is None:
+            return params
+
+        query = where.compile()
+        if params.keys() & query.keys():
+            return {"$and": [params, query]}
+        return {**params, **query}
+
+    @classmethod
+    @_instrumented("get")
+    async def get(
+        cls,
+        _trusted: typing.Optional[bool] = None,
+        _only: typing.Optional[typing.Iterable[str]] = None,
+        _exclude: typing.Optional[typing.Iterable[str]] = None,
+        _where: typing.Optional[Expression] = None,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> typing.Optional[typing.Self]:
+        with _call_deadline(_timeout):
+            _id = params.pop("id", None)
+
+            if _id is not None:
+                params["_id"] = _id
+            params = cls._merge_where(params, _where)
+
+            projection, unloaded = cls._projection(_only, _exclude)
+
+            identity_map = _identity_map.get()
+            if identity_map is not None and params.keys() == {"_id"}:
+                obj = identity_map.get(cls, params["_id"])
+                if obj is not None and not obj._unloaded - unloaded:
+                    return cls._track(obj)
+
+            if (
+                projection is not None
+                or _read_preference is not None
+                or _read_concern is not None
+            ):
+                # Per-call read options bypass the cache and batch loader
+                collection = cls.collection(
+                    read_preference=_read_preference, read_concern=_read_concern
+                )
+                _observe(params)
+                obj = await collection.find_one(params, projection, **_session_kwargs())
+                if not obj:
+                    raise DoesNotExist
+                return cls._load(obj, _trusted, unloaded=unloaded)
+
+            cache = cls._cache() if _session.get() is None else None
+            key = cls._cache_key(params) if cache is not None else None
+            codec_options = cls.collection().codec_options
+
+            if key is not None:
+                raw = await cache.get(key)
+                if raw is not None:
+                    cache.hits += 1
+                    return cls._load(bson.decode(raw, codec_options), _trusted)
+                cache.misses += 1
+                generation = cache.generation
+
+            _observe(params)
+            # A batched query runs under the first caller's deadline only
+            loader = cls._batch_loader(params) if _timeout is None else None
+            if loader is not None:
+                obj = await loader.load(next(iter(params.values())))
+            else:
+                obj = await cls.collection().find_one(params, **_session_kwargs())
+                if not obj:
+                    raise DoesNotExist
+
+            # A write during the query may have evicted the document we just read
+            if key is not None and cache.generation == generation:
+                await cache.set(key, bson.encode(obj, codec_options=codec_options))
+
+            return cls._load(obj, _trusted)
 
-        return cls(**obj)
+    @classmethod
+    @_instrumented("get_many")
+    async def get_many(
+        cls,
+        _filter=None,
+        _trusted: typing.Optional[bool] = None,
+        _prefetch: typing.Optional[list[str]] = None,
+        _only: typing.Optional[typing.Iterable[str]] = None,
+        _exclude: typing.Optional[typing.Iterable[str]] = None,
+        _where: typing.Optional[Expression] = None,
+        _lazy: bool = False,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> list[typing.Self]:
+        with _call_deadline(_timeout):
+            params = cls._merge_where(params, _where)
+            projection, unloaded = cls._projection(_only, _exclude)
+            collection = (cls.raw_collection if _lazy else cls.collection)(
+                read_preference=_read_preference, read_concern=_read_concern
+            )
+            _observe(params)
+            cursor = collection.find(params, projection, **_session_kwargs())
+            if _filter is not None:
+                _filter(cursor)
+
+            objs = [cls._load(e, _trusted, unloaded=unloaded) async for e in cursor]
+            if _prefetch:
+                await cls.prefetch(objs, _prefetch)
+
+            return objs
+
+    @staticmethod
+    async def prefetch(objs: typing.Iterable[Model], paths: typing.Iterable[str]):
+        for path in paths:
+            nodes = list(objs)
+            for part in path.split("."):
+                values = []
+                for node in nodes:
+                    if isinstance(node, Reference):
+                        if not node.loaded:
+                            continue
+                        node = node.obj
+
+                    value = getattr(node, part, None)
+                    if isinstance(value, (list, tuple)):
+                        values.extend(value)
+                    elif isinstance(value, dict):
+                        values.extend(value.values())
+                    elif value is not None:
+                        values.append(value)
+
+                await Reference.resolve(v for v in values if isinstance(v, Reference))
+                nodes = values
 
     @classmethod
-    async def get_many(cls, _filter=None, **params) -> list[typing.Self]:
-        cursor = cls.collection().find(params)
+    @_instrumented_iter("iter")
+    async def iter(
+        cls,
+        _filter=None,
+        batch_size: int = 100,
+        projection=None,
+        _trusted: typing.Optional[bool] = None,
+        _only: typing.Optional[typing.Iterable[str]] = None,
+        _exclude: typing.Optional[typing.Iterable[str]] = None,
+        _where: typing.Optional[Expression] = None,
+        _lazy: bool = False,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> typing.AsyncIterator[typing.Self]:
+        params = cls._merge_where(params, _where)
+        unloaded = frozenset()
+        if _only is not None or _exclude is not None:
+            projection, unloaded = cls._projection(_only, _exclude)
+
+        collection = (cls.raw_collection if _lazy else cls.collection)(
+            read_preference=_read_preference, read_concern=_read_concern
+        )
+        _observe(params)
+        cursor = collection.find(
+            params, projection, batch_size=batch_size, **_session_kwargs()
+        )
         if _filter is not None:
             _filter(cursor)
+        if _timeout is not None:
+            # A deadline context would leak into the caller between yields
+            cursor.max_time_ms(int(_timeout * 1000))
 
-        return [cls(**e) async for e in cursor]
+        try:
+            async for e in cursor:
+                yield cls._load(e, _trusted, unloaded=unloaded)
+        except PyMongoError as e:
+            if _timeout is not None and _is_timeout(e):
+                raise QueryTimeout(_timeout) from e
+            raise
 
     @classmethod
-    async def count(cls, **params) -> int:
-        return await cls.collection().count_documents(params)
+    async def iter_batches(
+        cls,
+        _filter=None,
+        batch_size: int = 100,
+        projection=None,
+        _trusted: typing.Optional[bool] = None,
+        _only: typing.Optional[typing.Iterable[str]] = None,
+        _exclude: typing.Optional[typing.Iterable[str]] = None,
+        _where: typing.Optional[Expression] = None,
+        _lazy: bool = False,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> typing.AsyncIterator[list[typing.Self]]:
+        batch = []
+        async for obj in cls.iter(
+            _filter,
+            batch_size,
+            projection,
+            _trusted,
+            _only,
+            _exclude,
+            _where,
+            _lazy,
+            _read_preference,
+            _read_concern,
+            _timeout,
+            **params,
+        ):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
 
-    async def create(self) -> typing.Self:
+    @classmethod
+    @_instrumented("values")
+    async def values(
+        cls,
+        fields: typing.Iterable[str],
+        _filter=None,
+        batch_size: int = 1000,
+        _where: typing.Optional[Expression] = None,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> dict[str, typing.Any]:
+        with _call_deadline(_timeout):
+            params = cls._merge_where(params, _where)
+            fields = list(fields)
+            model_fields = cls.model_fields
+            unknown = set(fields) - model_fields.keys()
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+            keys = [model_fields[name].alias or name for name in fields]
+            columns = {}
+            for name in fields:
+                typecode = _column_typecode(model_fields[name].annotation)
+                columns[name] = array.array(typecode) if typecode else []
+
+            projection = {key: 1 for key in keys}
+            if "_id" not in projection:
+                projection["_id"] = 0
+
+            collection = cls.collection(
+                read_preference=_read_preference, read_concern=_read_concern
+            )
+            _observe(params)
+            cursor = collection.find(
+                params, projection, batch_size=batch_size, **_session_kwargs()
+            )
+            if _filter is not None:
+                _filter(cursor)
+
+            appends = [columns[name].append for name in fields]
+            async for doc in cursor:
+                for i, key in enumerate(keys):
+                    value = doc.get(key)
+                    try:
+                        appends[i](value)
+                    except (TypeError, OverflowError):
+                        # A missing or mistyped value demotes the column to a list
+                        name = fields[i]
+                        columns[name] = [*columns[name], value]
+                        appends[i] = columns[name].append
+
+            return {name: _column_result(column) for name, column in columns.items()}
+
+    @classmethod
+    @_instrumented("paginate")
+    async def paginate(
+        cls,
+        _where: typing.Optional[Expression] = None,
+        order_by: typing.Iterable[FieldExpression | str | tuple] = (),
+        after: typing.Optional[str] = None,
+        limit: int = 100,
+        _trusted: typing.Optional[bool] = None,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> tuple[list[typing.Self], typing.Optional[str]]:
+        with _call_deadline(_timeout):
+            keys = _sort_keys(order_by)
+            if not any(key == "_id" for key, _ in keys):
+                direction = keys[-1][1] if keys else pymongo.ASCENDING
+                keys.append(("_id", direction))
+
+            sort_keys = keys[:-1] if keys[-1][0] == "_id" else keys
+            if sort_keys and not any(i.covers_sort(sort_keys) for i in cls.indexes()):
+                raise ValueError(
+                    f"No index in {cls.__name__}.Meta.INDEXES covers sort {sort_keys!r}"
+                )
+
+            query = cls._merge_where(params, _where)
+            if after is not None:
+                keyset = _keyset_filter(keys, _decode_token(after, keys))
+                query = {"$and": [query, keyset]} if query else keyset
+
+            collection = cls.collection(
+                read_preference=_read_preference, read_concern=_read_concern
+            )
+            _observe(query)
+            cursor = collection.find(query, **_session_kwargs())
+            cursor.sort(keys).limit(limit + 1)
+            docs = [doc async for doc in cursor]
+
+            token = None
+            if len(docs) > limit:
+                docs = docs[:limit]
+                token = _encode_token(keys, [_get_path(docs[-1], k) for k, _ in keys])
+
+            return [cls._load(doc, _trusted) for doc in docs], token
+
+    @classmethod
+    @_instrumented("count")
+    async def count(
+        cls,
+        _where: typing.Optional[Expression] = None,
+        _read_preference: typing.Optional[_ReadPreference] = None,
+        _read_concern: typing.Optional[ReadConcern] = None,
+        _timeout: typing.Optional[float] = None,
+        **params,
+    ) -> int:
+        with _call_deadline(_timeout):
+            params = cls._merge_where(params, _where)
+            collection = cls.collection(
+                read_preference=_read_preference, read_concern=_read_concern
+            )
+            _observe(params)
+            return await collection.count_documents(params, **_session_kwargs())
+
+    @_instrumented("create")
+    async def create(
+        self, _write_concern: typing.Optional[WriteConcern] = None
+    ) -> typing.Self:
         if self.id:
             raise AlreadyExists
 
         data = self._make_dump()
-        new = await self.collection().insert_one(data)
+        collection = self.collection(write_concern=_write_concern)
+        _observe(None, data)
+        new = await collection.insert_one(data, **_session_kwargs())
         self.id = new.inserted_id
 
-        self._take_snapshot()
+        data.pop("_id", None)
+        self._take_snapshot(data)
+        self._track(self)
+        await self._invalidate()
 
         return self
 
+    @classmethod
+    @_instrumented("create_many")
+    async def create_many(
+        cls,
+        objs: typing.Iterable[typing.Self],
+        ordered: bool = False,
+        batch_size: int = 1000,
+        _write_concern: typing.Optional[WriteConcern] = None,
+    ) -> tuple[list[typing.Self], list[tuple[typing.Self, typing.Optional[dict]]]]:
+        objs = list(objs)
+        if any(obj.id for obj in objs):
+            raise AlreadyExists
+
+        collection = cls.collection(write_concern=_write_concern)
+
+        created, failed = [], []
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start : start + batch_size]
+            snapshots = [obj._make_dump() for obj in batch]
+            docs = [{"_id": bson.ObjectId(), **data} for data in snapshots]
+
+            _observe(None, *docs)
+            errors = {}
+            try:
+                await collection.insert_many(docs, ordered=ordered, **_session_kwargs())
+            except BulkWriteError as e:
+                errors = _write_errors(e, len(docs), ordered)
+
+            for i, (obj, doc, data) in enumerate(zip(batch, docs, snapshots)):
+                if i in errors:
+                    # None marks objects an ordered insert never attempted
+                    failed.append((obj, errors[i]))
+                else:
+                    obj.id = doc["_id"]
+                    obj._take_snapshot(data)
+                    created.append(cls._track(obj))
+
+            if ordered and errors:
+                failed.extend((obj, None) for obj in objs[start + batch_size :])
+                break
+
+        return created, failed
+
     async def save(self) -> typing.Self:
-        try:
-            return await self.create()
-        except AlreadyExists:
+        if self.id:
             return await self.push_update()
+        return await self.create()
 
+    @_instrumented("push_update")
     async def push_update(self):
         if not self.id:
             raise DoesNotExist
 
-        diff = self._get_state_diff()
-        await self.collection().update_one({"_id": self.id}, {"$set": diff})
+        state = self._dirty_state()
+        update = self._get_update(state)
+        if update:
+            _observe({"_id": self.id}, update)
+            await self.collection().update_one(
+                {"_id": self.id}, update, **_session_kwargs()
+            )
+            await self._invalidate()
 
-        self._take_snapshot()
+        self._commit_state(state)
 
         return self
 
+    @_instrumented("replace")
     async def replace(self):
         if not self.id:
             raise DoesNotExist
 
-        await self.collection().replace_one({"_id": self.id}, self._make_dump())
+        # Replacing would drop every field that was projected out
+        self._require_loaded()
+
+        data = self._make_dump()
+        _observe({"_id": self.id}, data)
+        await self.collection().replace_one({"_id": self.id}, data, **_session_kwargs())
+        await self._invalidate()
 
-        self._take_snapshot()
+        self._take_snapshot(data)
 
         return self
 
+    @_instrumented("update")
     async def update(self, params) -> typing.Self:
         if not self.id:
             raise DoesNotExist
 
-        await self.collection().update_one({"_id": self.id}, params)
-        return await self.get(_id=self.id)
+        _observe({"_id": self.id}, params)
+        obj = await self.collection().find_one_and_update(
+            {"_id": self.id},
+            params,
+            return_document=pymongo.ReturnDocument.AFTER,
+            **_session_kwargs(),
+        )
+        if not obj:
+            raise DoesNotExist
 
-    @classmethod
-    async def update_many(cls, params, update):
-        await cls.collection().update_many(params, update)
+        await self._invalidate()
+        return self._load(obj, refresh=True)
+
+    @_instrumented("update_and_refresh")
+    async def update_and_refresh(self, params, projection=None) -> typing.Self:
+        if not self.id:
+            raise DoesNotExist
+
+        _observe({"_id": self.id}, params)
+        obj = await self.collection().find_one_and_update(
+            {"_id": self.id},
+            params,
+            projection=projection,
+            return_document=pymongo.ReturnDocument.AFTER,
+            **_session_kwargs(),
+        )
+        if not obj:
+            raise DoesNotExist
+
+        await self._invalidate()
+        self._refresh(obj)
+        return self
 
+    @classmethod
+    @_instrumented("update_many")
+    async def update_many(
+        cls, params, update, _write_concern: typing.Optional[WriteConcern] = None
+    ):
+        if isinstance(params, Expression):
+            params = params.compile()
+        collection = cls.collection(write_concern=_write_concern)
+        _observe(params, update)
+        await collection.update_many(params, update, **_session_kwargs())
+        await cls._invalidate_all()
+        cls._forget()
+
+    @_instrumented("delete")
     async def delete(self):
         if not self.id:
             raise DoesNotExist
 
-        await self.collection().delete_one({"_id": self.id})
+        _observe({"_id": self.id})
+        await self.collection().delete_one({"_id": self.id}, **_session_kwargs())
+        await self._invalidate()
+        self._forget(self)
         self.id = None
 
     @classmethod
-    async def delete_many(cls, **params):
-        await cls.collection().delete_many(params)
+    @_instrumented("delete_many")
+    async def delete_many(
+        cls,
+        _where: typing.Optional[Expression] = None,
+        _write_concern: typing.Optional[WriteConcern] = None,
+        **params,
+    ):
+        params = cls._merge_where(params, _where)
+        collection = cls.collection(write_concern=_write_concern)
+        _observe(params)
+        await collection.delete_many(params, **_session_kwargs())
+        await cls._invalidate_all()
+        cls._forget()
+
+    @classmethod
+    def _upsert(cls, params, others) -> tuple[dict, typing.Self, dict, dict]:
+        query = dict(params)
+        _id = query.pop("id", None)
+        if _id is not None:
+            query["_id"] = _id
+
+        obj = cls(**query, **others)
+        data = obj._make_dump()
+
+        on_insert = {k: v for k, v in data.items() if k not in query}
+        if "_id" not in query:
+            on_insert["_id"] = bson.ObjectId()
+        obj.id = query.get("_id", on_insert.get("_id"))
+
+        return query, obj, data, {"$setOnInsert": on_insert}
 
     @classmethod
+    @_instrumented("get_or_create")
     async def get_or_create(cls, params, others) -> (typing.Self, bool):
-        try:
-            obj = await cls.get(**params)
-            created = False
-        except DoesNotExist:
-            obj = await cls(**params, **others).create()
-            created = True
+        query, obj, data, update = cls._upsert(params, others)
+
+        _observe(query, update)
+        doc = await cls.collection().find_one_and_update(
+            query,
+            update,
+            upsert=True,
+            return_document=pymongo.ReturnDocument.BEFORE,
+            **_session_kwargs(),
+        )
+        if doc is None:
+            obj._take_snapshot(data)
+            return cls._track(obj), True
+
+        return cls._load(doc), False
 
-        return obj, created
+    @classmethod
+    @_instrumented("get_or_create_many")
+    async def get_or_create_many(
+        cls,
+        items: typing.Iterable[tuple[dict, dict]],
+        _write_concern: typing.Optional[WriteConcern] = None,
+    ) -> list[tuple[typing.Self, bool]]:
+        upserts = [cls._upsert(params, others) for params, others in items]
+        if not upserts:
+            return []
+
+        for query, _, _, update in upserts:
+            _observe(query, update)
+
+        result = await cls.collection(write_concern=_write_concern).bulk_write(
+            [
+                pymongo.UpdateOne(query, update, upsert=True)
+                for query, _, _, update in upserts
+            ],
+            ordered=False,
+            **_session_kwargs(),
+        )
+        upserted = result.upserted_ids
+
+        existing = [query for i, (query, *_) in enumerate(upserts) if i not in upserted]
+        docs = []
+        if existing:
+            collection = cls.collection()
+            if collection.read_preference != pymongo.ReadPreference.PRIMARY:
+                # Secondaries may not have the upserts yet
+                collection = cls.collection(
+                    read_preference=pymongo.ReadPreference.PRIMARY
+                )
+            _observe({"$or": existing})
+            cursor = collection.find({"$or": existing}, **_session_kwargs())
+            docs = [doc async for doc in cursor]
+
+        matches = {}
+        for i, (query, *_) in enumerate(upserts):
+            if i not in upserted:
+                j = next(
+                    (j for j, d in enumerate(docs) if _doc_matches(d, query)), None
+                )
+                if j is None:
+                    raise DoesNotExist
+                matches[i] = j
+
+        loaded = {j: cls._load(docs[j]) for j in set(matches.values())}
+
+        results = []
+        for i, (_, obj, data, _) in enumerate(upserts):
+            if i in upserted:
+                obj.id = upserted[i]
+                obj._take_snapshot(data)
+                results.append((cls._track(obj), True))
+            else:
+                results.append((loaded[matches[i]], False))
+
+        return results
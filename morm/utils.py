@@ -1,5 +1,9 @@
+import copy
+import functools
 import typing
 
+import bson
+
 
 def recursive_diff(
     prev: dict[str, typing.Any] | None, current: dict[str, typing.Any]
@@ -20,3 +24,165 @@ def recursive_diff(
                 diff[k] = v
 
     return diff
+
+
+def _bson_size(value: typing.Any) -> int:
+    return len(bson.encode({"v": value}))
+
+
+def _diff_list(
+    prev: list, current: list, path: str, update: dict[str, dict], unset: bool
+):
+    size = len(prev)
+
+    if size and len(current) > size and current[:size] == prev:
+        update["$push"][path] = {"$each": current[size:]}
+        return
+
+    if size and len(current) == size:
+        partial = {"$set": {}, "$unset": {}, "$push": {}}
+        for i, (p, c) in enumerate(zip(prev, current)):
+            if p == c:
+                continue
+
+            item_path = f"{path}.{i}"
+            if isinstance(p, dict) and isinstance(c, dict):
+                _diff_dict(p, c, f"{item_path}.", partial, unset)
+            elif isinstance(p, list) and isinstance(c, list):
+                _diff_list(p, c, item_path, partial, unset)
+            else:
+                partial["$set"][item_path] = c
+
+        if _bson_size(partial) < _bson_size(current):
+            for op, fields in partial.items():
+                update[op].update(fields)
+            return
+
+    update["$set"][path] = current
+
+
+def _diff_dict(
+    prev: dict,
+    current: dict,
+    prefix: str,
+    update: dict[str, dict],
+    unset: bool | typing.Container[str],
+):
+    for k, v in current.items():
+        path = f"{prefix}{k}"
+        if k not in prev:
+            update["$set"][path] = v
+            continue
+
+        prev_value = prev[k]
+        if v == prev_value:
+            continue
+
+        nested_unset = unset if isinstance(unset, bool) else k in unset
+        if isinstance(v, dict) and isinstance(prev_value, dict):
+            _diff_dict(prev_value, v, f"{path}.", update, nested_unset)
+        elif isinstance(v, list) and isinstance(prev_value, list):
+            _diff_list(prev_value, v, path, update, nested_unset)
+        else:
+            update["$set"][path] = v
+
+    if unset is True:
+        for k in prev.keys() - current.keys():
+            update["$unset"][f"{prefix}{k}"] = ""
+
+
+def update_diff(
+    prev: dict[str, typing.Any] | None,
+    current: dict[str, typing.Any],
+    unset: bool | typing.Container[str] = True,
+) -> dict[str, dict[str, typing.Any]]:
+    if not isinstance(prev, dict):
+        prev = {}
+
+    update = {"$set": {}, "$unset": {}, "$push": {}}
+    _diff_dict(prev, current, "", update, unset)
+
+    return {op: fields for op, fields in update.items() if fields}
+
+
+def _notify(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._on_change()
+        return result
+
+    return wrapper
+
+
+def _noop():
+    pass
+
+
+class TrackedList(list):
+    __slots__ = ("_on_change",)
+
+    def __init__(self, iterable=(), on_change: typing.Callable[[], None] = _noop):
+        super().__init__(iterable)
+        self._on_change = on_change
+
+    # Copies are plain lists, the owning model re-wraps them for itself
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+    def __copy__(self) -> list:
+        return list(self)
+
+    def __deepcopy__(self, memo) -> list:
+        result = memo[id(self)] = []
+        result.extend(copy.deepcopy(value, memo) for value in self)
+        return result
+
+
+class TrackedDict(dict):
+    __slots__ = ("_on_change",)
+
+    def __init__(self, mapping=(), on_change: typing.Callable[[], None] = _noop):
+        super().__init__(mapping)
+        self._on_change = on_change
+
+    def __reduce_ex__(self, protocol):
+        return dict, (dict(self),)
+
+    def __copy__(self) -> dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> dict:
+        result = memo[id(self)] = {}
+        result.update((key, copy.deepcopy(value, memo)) for key, value in self.items())
+        return result
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(TrackedList, _name, _notify(getattr(list, _name)))
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__ior__",
+    "pop",
+    "popitem",
+    "clear",
+    "update",
+    "setdefault",
+):
+    setattr(TrackedDict, _name, _notify(getattr(dict, _name)))
+del _name
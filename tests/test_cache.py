@@ -0,0 +1,37 @@
+import pytest
+
+from morm.cache import LRUCache
+
+
+@pytest.mark.asyncio
+async def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+
+    await cache.set("a", b"1")
+    await cache.set("b", b"2")
+    assert await cache.get("a") == b"1"
+
+    await cache.set("c", b"3")
+    assert await cache.get("b") is None
+    assert await cache.get("a") == b"1"
+    assert await cache.get("c") == b"3"
+    assert cache.evictions == 1
+
+    await cache.delete("a", "missing")
+    assert await cache.get("a") is None
+
+    await cache.clear()
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_lru_cache_ttl(mocker):
+    now = mocker.patch("time.monotonic", return_value=100.0)
+    cache = LRUCache(ttl=10)
+
+    await cache.set("a", b"1")
+    assert await cache.get("a") == b"1"
+
+    now.return_value = 111.0
+    assert await cache.get("a") is None
+    assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 1}
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+from morm.metrics import Histogram, Metrics, Operation, filter_shape
+
+
+def test_filter_shape():
+    assert filter_shape({"name": "Test", "num": {"$gt": 1, "$in": [1, 2]}}) == {
+        "name": "?",
+        "num": {"$gt": "?", "$in": ["?"]},
+    }
+    assert filter_shape({"$or": [{"a": 1}, {"a": 2}, {"b": 3}]}) == {
+        "$or": [{"a": "?"}, {"b": "?"}]
+    }
+
+
+def test_histogram():
+    histogram = Histogram([0.01, 0.1, 1.0])
+    for value in (0.005, 0.01, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(5.565)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_metrics(caplog):
+    records = []
+    metrics = Metrics(slow_ms=50, callback=records.append)
+
+    fast = Operation("TestModel", "get")
+    fast.duration, fast.validation, fast.documents = 0.01, 0.004, 1
+    fast.observe({"name": "Test"})
+
+    slow = Operation("TestModel", "get")
+    slow.duration = 0.2
+    slow.error = "DoesNotExist"
+
+    with caplog.at_level(logging.WARNING, logger="morm.slow"):
+        metrics.record(fast)
+        metrics.record(slow)
+
+    assert records == [fast, slow]
+    assert list(metrics.slow) == [slow]
+    assert "Slow TestModel.get" in caplog.text
+
+    stats = metrics.snapshot()["TestModel"]["get"]
+    assert stats["latency"]["count"] == 2
+    assert stats["documents"] == 1
+    assert stats["validation"] == 0.004
+    assert stats["wire"] == pytest.approx(0.206)
+    assert stats["bytes_sent"] == fast.bytes_sent > 0
+    assert stats["errors"] == 1
+    assert fast.as_dict()["filter"] == {"name": "?"}
+
+    metrics.callback = lambda op: 1 / 0
+    metrics.record(fast)
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+    assert not metrics.slow
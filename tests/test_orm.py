@@ -1,20 +1,55 @@
+import array
 import asyncio
+import copy
+import datetime
+import decimal
+import enum
 import json
+import pickle
 import typing
 
+import bson
+import mongomock
+import pymongo
 import pytest
-from mongomock_motor import AsyncMongoMockClient
-from pydantic import BaseModel, Field
+from bson.raw_bson import RawBSONDocument
+from mongomock_motor import AsyncMongoMockClient, AsyncMongoMockCollection
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PlainSerializer,
+    ValidationError,
+    field_serializer,
+)
+from pymongo import DeleteOne, InsertOne, ReadPreference, UpdateOne, WriteConcern
+from pymongo.errors import (
+    AutoReconnect,
+    BulkWriteError,
+    ExecutionTimeout,
+    OperationFailure,
+)
+from pymongo.read_concern import ReadConcern
 
 from morm import (
     ASC,
+    DESC,
     AlreadyExists,
     Database,
     DoesNotExist,
     DuplicateKeyError,
+    FlushError,
     Index,
+    LRUCache,
+    Metrics,
     Model,
+    NotLoaded,
+    ObjectId,
+    QueryTimeout,
+    Reference,
+    deadline,
 )
+from morm.orm import _codec
 
 
 @pytest.fixture()
@@ -429,7 +464,8 @@ def test_model_indexes(mock_mongoclient):
     with pytest.raises(DuplicateKeyError):
         asyncio.run(TestModel(name="Test").create())
 
-    assert asyncio.run(TestModel.collection().index_information()) == {
+    indexes = asyncio.run(TestModel.collection().index_information())
+    assert {k: {**v, "key": list(v["key"])} for k, v in indexes.items()} == {
         "_id_": {"key": [("_id", 1)], "v": 2},
         "name_1": {
             "key": [
@@ -506,3 +542,1970 @@ async def test_objectid_conversion(mock_mongoclient):
     assert dump == {"id": str(obj.id), "name": "Test", "num": 1}
 
     assert TestModel(**dump) == obj
+
+
+@pytest.mark.asyncio
+async def test_model_create_many(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    objs = [TestModel(name=f"Test {i}", num=i) for i in range(5)]
+    created, failed = await TestModel.create_many(objs, batch_size=2)
+
+    assert created == objs and failed == []
+    assert all(obj.id is not None for obj in objs)
+    assert await TestModel.get_many() == objs
+    assert objs[0]._get_state_diff() == {}
+
+
+@pytest.mark.asyncio
+async def test_model_create_many_already_exists(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    obj = await TestModel(name="Test").create()
+
+    with pytest.raises(AlreadyExists):
+        await TestModel.create_many([TestModel(name="New"), obj])
+
+
+@pytest.mark.asyncio
+async def test_model_create_many_duplicates(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index(("name", ASC), unique=True)]
+
+        name: str
+
+    await db.setup()
+
+    objs = [TestModel(name=name) for name in ("a", "a", "b")]
+    created, failed = await TestModel.create_many(objs)
+
+    assert created == [objs[0], objs[2]]
+    assert len(failed) == 1
+    assert failed[0][0] is objs[1] and failed[0][1]["code"] == 11000
+    assert objs[1].id is None
+    assert await TestModel.count() == 2
+
+
+@pytest.mark.asyncio
+async def test_model_create_many_ordered(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index(("name", ASC), unique=True)]
+
+        name: str
+
+    await db.setup()
+
+    objs = [TestModel(name=name) for name in ("a", "a", "b", "c")]
+    created, failed = await TestModel.create_many(objs, ordered=True, batch_size=2)
+
+    assert created == [objs[0]]
+    assert failed[0][0] is objs[1] and failed[0][1]["code"] == 11000
+    assert failed[1:] == [(objs[2], None), (objs[3], None)]
+    assert await TestModel.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_database_unit_of_work(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    existing = await TestModel(name="Test", num=1).create()
+    removed = await TestModel(name="Removed", num=2).create()
+    removed_id = removed.id
+    await TestModel(name="Untouched", num=3).create()
+
+    mock_bulk_write = mocker.AsyncMock()
+    TestModel.collection().bulk_write = mock_bulk_write
+
+    async with db.unit_of_work() as uow:
+        loaded = await TestModel.get_many()
+        loaded[0].name = "Hello World"
+
+        new = uow.add(TestModel(name="New", num=4))
+        uow.delete(removed)
+
+    mock_bulk_write.assert_awaited_once()
+    ops = mock_bulk_write.call_args.args[0]
+    assert mock_bulk_write.call_args.kwargs == {"ordered": False}
+    assert ops[0] == UpdateOne({"_id": existing.id}, {"$set": {"name": "Hello World"}})
+    assert ops[1] == InsertOne({"_id": new.id, "name": "New", "num": 4})
+    assert ops[2] == DeleteOne({"_id": removed_id})
+    assert len(ops) == 3
+
+    assert loaded[0]._get_state_diff() == {}
+    assert new.id is not None and new._get_state_diff() == {}
+    assert removed.id is None
+
+
+@pytest.mark.asyncio
+async def test_database_unit_of_work_failed(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    TestModel.collection().bulk_write = mocker.AsyncMock(
+        side_effect=BulkWriteError(
+            {"writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate"}]}
+        )
+    )
+
+    failed_obj = TestModel(name="Failed")
+    ok_obj = TestModel(name="Ok")
+
+    with pytest.raises(FlushError) as e:
+        async with db.unit_of_work() as uow:
+            uow.add(failed_obj)
+            uow.add(ok_obj)
+
+    assert e.value.failed == [
+        (failed_obj, {"index": 0, "code": 11000, "errmsg": "duplicate"})
+    ]
+    assert failed_obj.id is None
+    assert ok_obj.id is not None
+
+
+@pytest.mark.asyncio
+async def test_database_unit_of_work_exception(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    mock_bulk_write = mocker.AsyncMock()
+    TestModel.collection().bulk_write = mock_bulk_write
+
+    with pytest.raises(ValueError):
+        async with db.unit_of_work() as uow:
+            uow.add(TestModel(name="Test"))
+            raise ValueError
+
+    mock_bulk_write.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_model_iter(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    await TestModel(name="Test", num=1).create()
+    obj1 = await TestModel(name="Hello World", num=2).create()
+    obj2 = await TestModel(name="John Doe", num=2).create()
+
+    assert [obj async for obj in TestModel.iter(num=2, batch_size=1)] == [obj1, obj2]
+
+
+@pytest.mark.asyncio
+async def test_model_iter_filter(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    obj = await TestModel(name="Test", num=1).create()
+    await TestModel(name="Hello World", num=2).create()
+
+    result = [e async for e in TestModel.iter(lambda c: c.limit(1))]
+    assert result == [obj]
+
+
+@pytest.mark.asyncio
+async def test_model_iter_batches(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    objs = [await TestModel(name=f"Test {i}", num=i).create() for i in range(5)]
+
+    batches = [batch async for batch in TestModel.iter_batches(batch_size=2)]
+    assert batches == [objs[0:2], objs[2:4], objs[4:]]
+
+
+@pytest.mark.asyncio
+async def test_model_trusted_load(mock_mongoclient):
+    db = Database(name="test")
+
+    class Inner(BaseModel):
+        test: str = Field(default="default")
+        flag: bool = Field(default=False)
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            TRUSTED_LOAD = True
+
+        name: str
+        num: int
+        inner: Inner = Field(default_factory=Inner)
+        items: list[Inner] = Field(default_factory=list)
+
+    obj = await TestModel(name="Test", num=1, items=[{"flag": True}]).create()
+
+    obj_get = await TestModel.get(id=obj.id)
+    assert obj_get == obj
+    assert isinstance(obj_get.inner, Inner)
+    assert isinstance(obj_get.items[0], Inner) and obj_get.items[0].flag is True
+
+    obj_get.inner.flag = True
+    assert obj_get._get_state_diff() == {"inner.flag": True}
+
+    await TestModel.collection().insert_one({"name": "Broken", "num": "nan"})
+    broken = await TestModel.get(name="Broken")
+    assert broken.num == "nan"
+
+    with pytest.raises(ValidationError):
+        await TestModel.get(name="Broken", _trusted=False)
+
+
+@pytest.mark.asyncio
+async def test_model_trusted_load_per_query(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    await TestModel.collection().insert_one({"name": "Broken", "num": "nan"})
+
+    with pytest.raises(ValidationError):
+        await TestModel.get_many()
+
+    assert [obj.num for obj in await TestModel.get_many(_trusted=True)] == ["nan"]
+
+
+@pytest.mark.asyncio
+async def test_model_trusted_load_sampled(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            TRUSTED_LOAD = True
+            TRUSTED_SAMPLE_RATE = 1.0
+
+        name: str
+        num: int
+
+    await TestModel.collection().insert_one({"name": "Broken", "num": "nan"})
+
+    with pytest.raises(ValidationError):
+        await TestModel.get(name="Broken")
+
+
+@pytest.mark.asyncio
+async def test_model_decimal_fields(mock_mongoclient):
+    db = Database(name="test")
+
+    class Inner(BaseModel):
+        amount: decimal.Decimal
+
+    @db
+    class TestModel(Model):
+        price: decimal.Decimal
+        history: list[decimal.Decimal] = Field(default_factory=list)
+        discount: typing.Optional[decimal.Decimal] = None
+        inner: typing.Optional[Inner] = None
+
+    obj = await TestModel(
+        price=decimal.Decimal("9.99"),
+        history=[decimal.Decimal("10.50")],
+        discount=decimal.Decimal("0.1"),
+        inner=Inner(amount=decimal.Decimal("1.25")),
+    ).create()
+
+    doc = await TestModel.collection().find_one({"_id": obj.id})
+    assert doc["price"] == bson.Decimal128("9.99")
+    assert doc["history"] == [bson.Decimal128("10.50")]
+    assert doc["discount"] == bson.Decimal128("0.1")
+    assert doc["inner"] == {"amount": bson.Decimal128("1.25")}
+
+    assert (TestModel.price > decimal.Decimal("5")).compile() == {
+        "price": {"$gt": bson.Decimal128("5")}
+    }
+
+    for trusted in (True, False):
+        loaded = await TestModel.get(
+            _where=TestModel.price == decimal.Decimal("9.99"), _trusted=trusted
+        )
+        assert loaded == obj
+        assert isinstance(loaded.price, decimal.Decimal)
+        assert isinstance(loaded.history[0], decimal.Decimal)
+        assert isinstance(loaded.inner.amount, decimal.Decimal)
+        assert loaded._get_state_diff() == {}
+
+    loaded.price = decimal.Decimal("19.99")
+    await loaded.push_update()
+    assert (await TestModel.get(id=obj.id)).price == decimal.Decimal("19.99")
+
+
+@pytest.mark.asyncio
+async def test_model_snapshot_from_document(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    class Inner(BaseModel):
+        test: str = Field(default="default")
+        tags: list[str] = Field(default_factory=list)
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+        inner: Inner = Field(default_factory=Inner)
+
+    obj = TestModel(name="Test", num=1, inner={"tags": ["a"]})
+    assert obj._state_snapshot is None
+    await obj.create()
+
+    spy = mocker.spy(TestModel, "_make_dump")
+    obj_get = await TestModel.get(id=obj.id)
+    [obj_many] = await TestModel.get_many(_trusted=True)
+    spy.assert_not_called()
+
+    for loaded in (obj_get, obj_many):
+        assert loaded._get_state_diff() == {}
+        loaded.inner.tags.append("b")
+        loaded.num = 2
+        assert loaded._get_state_diff() == {"num": 2, "inner.tags": ["a", "b"]}
+
+
+@pytest.mark.asyncio
+async def test_model_snapshot_untyped_field(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        data: dict
+
+    obj = await TestModel(data={"inner": {"flag": False}}).create()
+
+    obj_get = await TestModel.get(id=obj.id)
+    obj_get.data["inner"]["flag"] = True
+    assert obj_get._get_state_diff() == {"data.inner.flag": True}
+
+
+@pytest.mark.asyncio
+async def test_model_dirty_tracking(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+        tags: list[str] = Field(default_factory=list)
+        counters: dict[str, int] = Field(default_factory=dict)
+
+    obj = await TestModel(name="Test", num=1, tags=["a"]).create()
+    obj_get = await TestModel.get(id=obj.id)
+
+    assert obj_get._dirty_state() == {}
+
+    obj_get.num = 2
+    obj_get.tags.append("b")
+    assert obj_get._dirty_state() == {"num": 2, "tags": ["a", "b"]}
+
+    obj_get.counters["x"] = 1
+    assert obj_get._get_state_diff() == {
+        "num": 2,
+        "tags": ["a", "b"],
+        "counters.x": 1,
+    }
+
+    await obj_get.push_update()
+    assert obj_get._dirty_state() == {}
+    assert (await TestModel.get(id=obj.id)).model_dump() == obj_get.model_dump()
+
+    mock_update_one = mocker.AsyncMock()
+    TestModel.collection().update_one = mock_update_one
+
+    await obj_get.push_update()
+    mock_update_one.assert_not_awaited()
+
+    obj_get.tags = ["c"]
+    obj_get.tags.append("d")
+    await obj_get.push_update()
+    mock_update_one.assert_awaited_once_with(
+        {"_id": obj.id}, {"$set": {"tags": ["c", "d"]}}
+    )
+
+
+@pytest.mark.asyncio
+async def test_model_dirty_tracking_opaque(mock_mongoclient):
+    db = Database(name="test")
+
+    class Inner(BaseModel):
+        flag: bool = Field(default=False)
+
+    @db
+    class TestModel(Model):
+        name: str
+        inner: Inner = Field(default_factory=Inner)
+
+    obj = await TestModel(name="Test").create()
+
+    assert obj._dirty_state() == {"inner": {"flag": False}}
+    assert obj._get_state_diff() == {}
+
+    obj.inner.flag = True
+    assert obj._get_state_diff() == {"inner.flag": True}
+
+
+@pytest.mark.asyncio
+async def test_model_push_update_array_and_unset(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        events: list[int] = Field(default_factory=list)
+        counters: dict[str, int] = Field(default_factory=dict)
+
+    obj = await TestModel(name="Test", events=[1, 2], counters={"a": 1}).create()
+    await TestModel.collection().update_one({"_id": obj.id}, {"$set": {"legacy": 1}})
+
+    obj_get = await TestModel.get(id=obj.id)
+    obj_get.events.extend([3, 4])
+    del obj_get.counters["a"]
+    await obj_get.push_update()
+
+    assert await TestModel.collection().find_one({"_id": obj.id}) == {
+        "_id": obj.id,
+        "name": "Test",
+        "events": [1, 2, 3, 4],
+        "counters": {},
+        "legacy": 1,
+    }
+
+    mock_update_one = mocker.AsyncMock()
+    TestModel.collection().update_one = mock_update_one
+
+    obj_get.events.append(5)
+    obj_get.counters["b"] = 2
+    await obj_get.push_update()
+
+    mock_update_one.assert_awaited_once_with(
+        {"_id": obj.id},
+        {"$set": {"counters.b": 2}, "$push": {"events": {"$each": [5]}}},
+    )
+
+
+@pytest.mark.asyncio
+async def test_model_push_update_unset_free_form(mock_mongoclient):
+    db = Database(name="test")
+
+    class Inner(BaseModel):
+        data: dict = Field(default_factory=dict)
+
+    @db
+    class TestModel(Model):
+        meta: dict[str, typing.Any]
+        raw: dict
+        inner: Inner
+        items: list[dict[str, typing.Any]]
+
+    obj = await TestModel(
+        meta={"a": 1, "b": [1]},
+        raw={"a": 1, "b": 2},
+        inner=Inner(data={"a": 1, "b": 2}),
+        items=[{"a": 1, "b": 2}],
+    ).create()
+    await TestModel.collection().update_one({"_id": obj.id}, {"$set": {"legacy": 1}})
+
+    loaded = await TestModel.get(id=obj.id)
+    del loaded.meta["b"]
+    del loaded.raw["b"]
+    del loaded.inner.data["b"]
+    del loaded.items[0]["b"]
+    await loaded.push_update()
+
+    assert await TestModel.collection().find_one({"_id": obj.id}) == {
+        "_id": obj.id,
+        "meta": {"a": 1},
+        "raw": {"a": 1},
+        "inner": {"data": {"a": 1}},
+        "items": [{"a": 1}],
+        "legacy": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_model_update_single_round_trip(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    obj = await TestModel(name="Test", num=1).create()
+
+    spy = mocker.spy(TestModel.collection(), "find_one_and_update")
+    mock_find_one = mocker.AsyncMock()
+    TestModel.collection().find_one = mock_find_one
+
+    obj_new = await obj.update({"$inc": {"num": 1}})
+
+    assert obj_new.id == obj.id and obj_new.num == 2
+    assert obj.num == 1
+    spy.assert_called_once()
+    mock_find_one.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_model_update_and_refresh(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+        tags: list[str] = Field(default_factory=list)
+
+    obj = await TestModel(name="Test", num=1).create()
+    obj.name = "Local"
+
+    await obj.update_and_refresh(
+        {"$inc": {"num": 1}, "$push": {"tags": "a"}}, projection={"num": 1, "tags": 1}
+    )
+
+    assert obj.num == 2 and obj.tags == ["a"]
+    assert obj.name == "Local"
+    assert obj._get_state_diff() == {"name": "Local"}
+
+    obj.tags.append("b")
+    assert obj._get_update() == {
+        "$set": {"name": "Local"},
+        "$push": {"tags": {"$each": ["b"]}},
+    }
+
+
+@pytest.mark.asyncio
+async def test_model_update_and_refresh_deleted(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    obj = await TestModel(name="Test").create()
+    await TestModel.delete_many()
+
+    with pytest.raises(DoesNotExist):
+        await obj.update_and_refresh({"$set": {"name": "New"}})
+
+
+@pytest.mark.asyncio
+async def test_model_get_or_create_single_round_trip(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+        tags: list[str] = Field(default_factory=list)
+
+    spy = mocker.spy(TestModel.collection(), "find_one_and_update")
+
+    obj, created = await TestModel.get_or_create({"name": "Test"}, {"num": 1})
+    obj_get, created_get = await TestModel.get_or_create({"name": "Test"}, {"num": 2})
+
+    assert created is True and created_get is False
+    assert obj_get.id == obj.id and obj_get.num == 1
+    assert spy.call_count == 2
+    assert await TestModel.collection().find_one({"_id": obj.id}) == {
+        "_id": obj.id,
+        "name": "Test",
+        "num": 1,
+        "tags": [],
+    }
+
+
+@pytest.mark.asyncio
+async def test_model_get_or_create_many(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    existing = await TestModel(name="Existing", num=1).create()
+
+    new_id = bson.ObjectId()
+    mock_bulk_write = mocker.AsyncMock(
+        return_value=mocker.Mock(upserted_ids={1: new_id})
+    )
+    TestModel.collection().bulk_write = mock_bulk_write
+
+    results = await TestModel.get_or_create_many(
+        [({"name": "Existing"}, {"num": 2}), ({"name": "New"}, {"num": 3})]
+    )
+
+    [(obj1, created1), (obj2, created2)] = results
+    assert created1 is False and obj1.id == existing.id and obj1.num == 1
+    assert created2 is True and obj2.id == new_id and obj2.num == 3
+
+    mock_bulk_write.assert_awaited_once()
+    assert len(mock_bulk_write.call_args.args[0]) == 2
+    assert mock_bulk_write.call_args.kwargs == {"ordered": False}
+
+
+@pytest.mark.asyncio
+async def test_database_setup_idempotent(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index(("name", ASC), unique=True), Index("num")]
+
+        name: str
+        num: int
+
+    @db
+    class OtherModel(Model):
+        name: str
+
+    spy = mocker.spy(TestModel.collection(), "create_indexes")
+
+    assert await db.setup() == {}
+    spy.assert_called_once()
+    assert [i.document["name"] for i in spy.call_args.args[0]] == ["name_1", "num_1"]
+
+    assert await db.setup() == {}
+    spy.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_database_setup_drift(mock_mongoclient, caplog):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index("name")]
+
+        name: str
+        num: int
+
+    await TestModel.collection().create_index("num")
+
+    assert await db.setup() == {"testmodel": ["num_1"]}
+    assert "num_1" in caplog.text
+
+
+@pytest.fixture()
+def mock_session(mocker, mock_mongoclient):
+    session = mocker.Mock()
+    transaction = mocker.AsyncMock()
+    session.start_transaction = mocker.AsyncMock(return_value=transaction)
+    session_with = mocker.AsyncMock()
+    session_with.__aenter__.return_value = session
+    mocker.patch(
+        "mongomock_motor.AsyncMongoMockClient.start_session",
+        return_value=session_with,
+        create=True,
+    )
+
+    mongomock.ignore_feature("session")
+    yield session
+    mongomock.warn_on_feature("session")
+
+
+@pytest.mark.asyncio
+async def test_database_transaction_session(mock_session, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    obj = await TestModel(name="Test").create()
+
+    spy_find_one = mocker.spy(TestModel.collection(), "find_one")
+    spy_insert_one = mocker.spy(TestModel.collection(), "insert_one")
+
+    @db.atomic
+    async def some_function():
+        await TestModel.get(id=obj.id)
+        await TestModel(name="New").create()
+
+    await some_function()
+
+    assert spy_find_one.call_args.kwargs == {"session": mock_session}
+    assert spy_insert_one.call_args.kwargs == {"session": mock_session}
+
+    await TestModel.get(id=obj.id)
+    assert spy_find_one.call_args.kwargs == {}
+
+
+@pytest.mark.asyncio
+async def test_database_atomic_retry(mock_session, mocker):
+    db = Database(name="test")
+
+    error = OperationFailure("transient")
+    error._add_error_label("TransientTransactionError")
+    func = mocker.AsyncMock(side_effect=[error, error, "done"])
+
+    assert await db.atomic(func)() == "done"
+    assert func.await_count == 3
+
+    func = mocker.AsyncMock(side_effect=error)
+    with pytest.raises(OperationFailure):
+        await db.atomic(retries=1)(func)()
+    assert func.await_count == 2
+
+    func = mocker.AsyncMock(side_effect=OperationFailure("fatal"))
+    with pytest.raises(OperationFailure):
+        await db.atomic(func)()
+    func.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_database_scope_identity_map(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int
+
+    obj = await TestModel(name="Test", num=1).create()
+    await TestModel(name="Other", num=2).create()
+
+    spy = mocker.spy(TestModel.collection(), "find_one")
+
+    async with db.scope():
+        obj1 = await TestModel.get(id=obj.id)
+        obj2 = await TestModel.get(id=obj.id)
+        many = await TestModel.get_many(num=1)
+
+        assert obj1 is obj2 and obj1 is not obj
+        assert many[0] is obj1
+        spy.assert_called_once()
+
+        obj3 = await TestModel.get(name="Test")
+        assert obj3 is obj1
+
+        updated = await obj.update({"$set": {"num": 5}})
+        assert updated is obj1 and obj1.num == 5
+
+        created = await TestModel(name="New", num=3).create()
+        assert await TestModel.get(id=created.id) is created
+
+        created_id = created.id
+        await created.delete()
+        with pytest.raises(DoesNotExist):
+            await TestModel.get(id=created_id)
+
+    assert await TestModel.get(id=obj.id) is not obj1
+
+
+@pytest.mark.asyncio
+async def test_model_cache(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index("email", unique=True)]
+            CACHE = LRUCache()
+
+        email: str
+        num: int
+
+    TestModel.collection().codec_options = bson.codec_options.DEFAULT_CODEC_OPTIONS
+
+    obj = await TestModel(email="test@example.com", num=1).create()
+    spy = mocker.spy(TestModel.collection(), "find_one")
+
+    obj1 = await TestModel.get(id=obj.id)
+    obj2 = await TestModel.get(id=obj.id)
+    obj3 = await TestModel.get(email="test@example.com")
+    obj4 = await TestModel.get(email="test@example.com")
+
+    assert obj1 == obj2 and obj1 is not obj2
+    assert obj3.id == obj4.id == obj.id
+    assert spy.call_count == 2
+    assert TestModel._cache().stats() == {"hits": 2, "misses": 2, "evictions": 0}
+
+    await TestModel.get(num=1)
+    assert spy.call_count == 3
+
+    obj2.num = 2
+    obj2.email = "new@example.com"
+    await obj2.push_update()
+
+    assert (await TestModel.get(id=obj.id)).num == 2
+    with pytest.raises(DoesNotExist):
+        await TestModel.get(email="test@example.com")
+
+    await TestModel.get(id=obj.id)
+    await TestModel.update_many({}, {"$set": {"num": 3}})
+    assert (await TestModel.get(id=obj.id)).num == 3
+
+    await obj.delete()
+    with pytest.raises(DoesNotExist):
+        await TestModel.get(email="new@example.com")
+
+
+@pytest.mark.asyncio
+async def test_model_cache_field_name(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        cache: str
+
+    obj = await TestModel(cache="value").create()
+    obj.cache = "other"
+    await obj.push_update()
+    assert (await TestModel.get(id=obj.id)).cache == "other"
+    await obj.delete()
+
+
+@pytest.mark.asyncio
+async def test_model_cache_transaction(mock_session, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            CACHE = LRUCache()
+
+        num: int
+
+    TestModel.collection().codec_options = bson.codec_options.DEFAULT_CODEC_OPTIONS
+
+    obj = await TestModel(num=1).create()
+    updated = asyncio.Event()
+
+    async def reader():
+        await updated.wait()
+        return await TestModel.get(id=obj.id)
+
+    # Started outside the transaction, so it reads through the cache
+    task = asyncio.create_task(reader())
+
+    async with db.transaction():
+        obj.num = 2
+        await obj.push_update()
+        updated.set()
+        await task
+
+    spy = mocker.spy(TestModel.collection(), "find_one")
+    assert (await TestModel.get(id=obj.id)).num == 2
+    spy.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_model_cache_concurrent_write(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            CACHE = LRUCache()
+
+        num: int
+
+    collection = TestModel.collection()
+    collection.codec_options = bson.codec_options.DEFAULT_CODEC_OPTIONS
+
+    obj = await TestModel(num=1).create()
+    find_one = collection.find_one
+
+    async def racing_find_one(*args, **kwargs):
+        # The write lands while the read reply is in flight
+        doc = await find_one(*args, **kwargs)
+        obj.num = 2
+        await obj.push_update()
+        return doc
+
+    mocker.patch.object(collection, "find_one", side_effect=racing_find_one)
+    assert (await TestModel.get(id=obj.id)).num == 1
+
+    mocker.patch.object(collection, "find_one", side_effect=find_one)
+    assert (await TestModel.get(id=obj.id)).num == 2
+
+
+@pytest.mark.asyncio
+async def test_model_batch_load(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            BATCH_LOAD = True
+            INDEXES = [Index(("name", ASC), unique=True)]
+
+        name: str
+
+    objs = [await TestModel(name=f"Test {i}").create() for i in range(3)]
+    missing = bson.ObjectId()
+
+    spy_find = mocker.spy(TestModel.collection(), "find")
+    spy_find_one = mocker.spy(TestModel.collection(), "find_one")
+
+    results = await asyncio.gather(
+        *(TestModel.get(id=obj.id) for obj in objs),
+        TestModel.get(id=objs[0].id),
+        TestModel.get(id=missing),
+        return_exceptions=True,
+    )
+
+    assert results[:4] == [*objs, objs[0]]
+    assert results[0] is not results[3]
+    assert isinstance(results[4], DoesNotExist)
+
+    spy_find.assert_called_once()
+    assert set(spy_find.call_args.args[0]["_id"]["$in"]) == {
+        *(obj.id for obj in objs),
+        missing,
+    }
+    spy_find_one.assert_not_called()
+
+    assert [
+        obj.name
+        for obj in await asyncio.gather(
+            TestModel.get(name="Test 1"), TestModel.get(name="Test 2")
+        )
+    ] == ["Test 1", "Test 2"]
+    assert spy_find.call_count == 2
+
+    await TestModel.get(name="Test 1", id=objs[1].id)
+    spy_find_one.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_model_batch_load_unbatched_fields(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    class Sub(BaseModel):
+        code: str
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            BATCH_LOAD = True
+            INDEXES = [
+                Index(("sub.code", ASC), unique=True),
+                Index(("tags", ASC), unique=True),
+            ]
+
+        name: str
+        sub: Sub
+        tags: list[str] = Field(default_factory=list)
+
+    obj = await TestModel(name="Test", sub=Sub(code="c"), tags=["t1", "t2"]).create()
+    await TestModel(name="Test", sub=Sub(code="d")).create()
+
+    spy_find = mocker.spy(TestModel.collection(), "find")
+    results = await asyncio.gather(
+        TestModel.get(**{"sub.code": "c"}),
+        TestModel.get(tags="t1"),
+        TestModel.get(tags="t2"),
+    )
+    assert [r.id for r in results] == [obj.id] * 3
+    spy_find.assert_not_called()
+
+    with pytest.raises(DoesNotExist):
+        await TestModel.get(name="Missing")
+
+
+@pytest.mark.asyncio
+async def test_model_reference_prefetch(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class User(Model):
+        name: str
+
+    class Comment(BaseModel):
+        text: str
+        user: Reference[User]
+
+    @db
+    class Post(Model):
+        title: str
+        author: Reference[User]
+        editor: typing.Optional[Reference[User]] = None
+        comments: list[Comment] = Field(default_factory=list)
+
+    alice = await User(name="Alice").create()
+    bob = await User(name="Bob").create()
+
+    post = await Post(
+        title="Hello",
+        author=alice,
+        comments=[{"text": "Hi", "user": bob.id}, {"text": "Yo", "user": alice.id}],
+    ).create()
+    await Post(title="World", author=bob.id).create()
+
+    assert await Post.collection().find_one({"_id": post.id}) == {
+        "_id": post.id,
+        "title": "Hello",
+        "author": alice.id,
+        "editor": None,
+        "comments": [
+            {"text": "Hi", "user": bob.id},
+            {"text": "Yo", "user": alice.id},
+        ],
+    }
+
+    spy = mocker.spy(User.collection(), "find")
+    posts = await Post.get_many(_prefetch=["author", "comments.user"])
+
+    assert spy.call_count == 2
+    assert [p.author.obj.name for p in posts] == ["Alice", "Bob"]
+    assert [c.user.obj.name for c in posts[0].comments] == ["Bob", "Alice"]
+
+    [lazy] = await Post.get_many(title="World")
+    with pytest.raises(RuntimeError):
+        lazy.author.obj
+    assert (await lazy.author.fetch()).name == "Bob"
+
+    lazy.editor = alice
+    assert isinstance(lazy.editor, Reference) and lazy.editor.id == alice.id
+    await lazy.push_update()
+    assert (await Post.get(id=lazy.id)).editor == Reference(User, alice.id)
+
+
+@pytest.mark.asyncio
+async def test_model_projection(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        body: str = Field(alias="b")
+        tags: list[str] = Field(default_factory=list)
+
+    obj = await TestModel(name="Test", body="x" * 100, tags=["a"]).create()
+
+    spy = mocker.spy(TestModel.collection(), "find_one")
+    partial = await TestModel.get(id=obj.id, _only=["name"])
+    assert spy.call_args.args[1] == {"_id": 1, "name": 1}
+
+    assert partial.id == obj.id and partial.name == "Test"
+    with pytest.raises(NotLoaded):
+        partial.body
+    assert getattr(partial, "tags", None) is None
+    with pytest.raises(NotLoaded):
+        partial.model_dump()
+    with pytest.raises(NotLoaded):
+        partial.model_dump_json()
+    with pytest.raises(NotLoaded):
+        partial.as_base()
+    assert partial.model_dump(include={"id", "name"}) == {"id": obj.id, "name": "Test"}
+    assert partial.model_dump(exclude={"body", "tags"}) == {
+        "id": obj.id,
+        "name": "Test",
+    }
+
+    partial.name = "Renamed"
+    await partial.push_update()
+    assert await TestModel.collection().find_one({"_id": obj.id}) == {
+        "_id": obj.id,
+        "name": "Renamed",
+        "b": "x" * 100,
+        "tags": ["a"],
+    }
+
+    with pytest.raises(NotLoaded):
+        await partial.replace()
+
+    partial.tags = ["b"]
+    await partial.push_update()
+    assert (await TestModel.get(id=obj.id)).tags == ["b"]
+
+    [excluded] = await TestModel.get_many(_exclude=["body"])
+    assert excluded.tags == ["b"]
+    excluded.tags.append("c")
+    await excluded.push_update()
+    assert (await TestModel.get(id=obj.id)).tags == ["b", "c"]
+
+    assert [o.name async for o in TestModel.iter(_only=["name"], _trusted=True)] == [
+        "Renamed"
+    ]
+
+    with pytest.raises(ValueError):
+        await TestModel.get(id=obj.id, _only=["name"], _exclude=["tags"])
+    with pytest.raises(ValueError):
+        await TestModel.get_many(_only=["missing"])
+
+    async with db.scope():
+        partial = await TestModel.get(id=obj.id, _only=["name"])
+        full = await TestModel.get(id=obj.id)
+        assert full is partial and full.body == "x" * 100
+
+
+@pytest.mark.asyncio
+async def test_model_values(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        num: int = Field(alias="n")
+        score: float
+        active: bool
+        extra: typing.Optional[int] = None
+
+    for i in range(3):
+        await TestModel(name=f"Test {i}", num=i, score=i / 2, active=i % 2).create()
+    await TestModel.collection().update_one({"name": "Test 2"}, {"$unset": {"n": 1}})
+
+    validate = mocker.spy(TestModel, "model_validate")
+    columns = await TestModel.values(
+        ["num", "score", "active", "name", "id"],
+        _filter=lambda c: c.sort("name", DESC),
+        name={"$ne": "Test 0"},
+    )
+    validate.assert_not_called()
+
+    assert isinstance(columns["score"], array.array)
+    assert columns["score"].typecode == "d" and list(columns["score"]) == [1.0, 0.5]
+    assert columns["active"].typecode == "b" and list(columns["active"]) == [0, 1]
+    assert columns["num"] == [None, 1]
+    assert columns["name"] == ["Test 2", "Test 1"]
+    assert len(columns["id"]) == 2
+
+    columns = await TestModel.values(["num", "extra"], n=0)
+    assert columns["num"].typecode == "q" and list(columns["num"]) == [0]
+    assert columns["extra"] == [None]
+
+    with pytest.raises(ValueError):
+        await TestModel.values(["missing"])
+
+
+def test_model_field_expressions():
+    class Address(BaseModel):
+        city: str = Field(alias="c")
+
+    class TestModel(Model):
+        name: str
+        age: int = Field(alias="a")
+        address: typing.Optional[Address] = None
+
+    assert (TestModel.age > 30).compile() == {"a": {"$gt": 30}}
+    assert TestModel.id.key == "_id"
+    assert (TestModel.address.city == "Paris").compile() == {"address.c": "Paris"}
+
+    expr = (TestModel.age >= 18) & (TestModel.age < 65) & (TestModel.name != "x")
+    assert expr.compile() == {"a": {"$gte": 18, "$lt": 65}, "name": {"$ne": "x"}}
+
+    expr = (TestModel.name == "a") & (TestModel.name.in_(["a", "b"]))
+    assert expr.compile() == {"$and": [{"name": "a"}, {"name": {"$in": ["a", "b"]}}]}
+
+    expr = (TestModel.name == "a") | ~(TestModel.age.exists())
+    assert expr.compile() == {
+        "$or": [{"name": "a"}, {"$nor": [{"a": {"$exists": True}}]}]
+    }
+
+    class OtherModel(TestModel):
+        age: float = Field(alias="a")
+
+    assert OtherModel.model_fields["age"].annotation is float
+
+
+def test_model_field_expressions_merge():
+    class TestModel(Model):
+        name: str
+        age: int
+
+    expr = (TestModel.name == "a") & (TestModel.age > 1) & (TestModel.age < 5)
+    assert expr.compile() == {"name": "a", "age": {"$gt": 1, "$lt": 5}}
+
+    expr = (TestModel.age > 1) & (TestModel.age > 2)
+    assert expr.compile() == {"$and": [{"age": {"$gt": 1}}, {"age": {"$gt": 2}}]}
+
+    expr = (TestModel.name == "a") & (TestModel.name.exists())
+    assert expr.compile() == {"$and": [{"name": "a"}, {"name": {"$exists": True}}]}
+
+
+@pytest.mark.asyncio
+async def test_model_query(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+        age: int = Field(alias="a")
+
+    for i in range(5):
+        await TestModel(name=f"Test {i}", age=i * 10).create()
+
+    assert {o.age for o in await TestModel.get_many(_where=TestModel.age >= 30)} == {
+        30,
+        40,
+    }
+    assert (await TestModel.get(_where=TestModel.name == "Test 2")).age == 20
+    assert await TestModel.count(_where=TestModel.age.in_([0, 10, 99])) == 2
+    assert (
+        await TestModel.count(
+            _where=(TestModel.age < 10) | (TestModel.name == "Test 4"),
+        )
+        == 2
+    )
+
+    query = TestModel.query(TestModel.age > 0).sort(TestModel.age.desc()).skip(1)
+    assert [o.age for o in await query.limit(2).all()] == [30, 20]
+    assert (await query.first()).age == 30
+    assert await query.count() == 2
+    assert [o.age async for o in TestModel.query().sort(TestModel.age)] == [
+        0,
+        10,
+        20,
+        30,
+        40,
+    ]
+
+    await TestModel.delete_many(_where=TestModel.age < 20)
+    assert await TestModel.count() == 3
+
+
+@pytest.mark.asyncio
+async def test_model_paginate(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index(("s", ASC), ("_id", ASC))]
+
+        name: str
+        score: int = Field(alias="s")
+
+    for i in range(7):
+        await TestModel(name=f"Test {i}", score=i // 2).create()
+
+    names, token = [], None
+    while True:
+        page, token = await TestModel.paginate(
+            order_by=[TestModel.score], after=token, limit=3
+        )
+        names.extend(obj.name for obj in page)
+        if token is None:
+            break
+    assert names == [f"Test {i}" for i in range(7)]
+
+    page, token = await TestModel.paginate(
+        _where=TestModel.score < 3, order_by=[TestModel.score.desc()], limit=4
+    )
+    assert [o.score for o in page] == [2, 2, 1, 1]
+    page, token = await TestModel.paginate(
+        _where=TestModel.score < 3,
+        order_by=[TestModel.score.desc()],
+        after=token,
+        limit=4,
+    )
+    assert [o.score for o in page] == [0, 0] and token is None
+
+    assert len((await TestModel.paginate(limit=10))[0]) == 7
+
+    with pytest.raises(ValueError):
+        await TestModel.paginate(order_by=[TestModel.name])
+    with pytest.raises(ValueError):
+        await TestModel.paginate(order_by=[TestModel.score], after="garbage")
+
+    _, token = await TestModel.paginate(order_by=[TestModel.score], limit=1)
+    with pytest.raises(ValueError):
+        await TestModel.paginate(order_by=[TestModel.score.desc()], after=token)
+
+
+@pytest.mark.asyncio
+async def test_model_paginate_nulls(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            INDEXES = [Index(("n", ASC), ("_id", ASC))]
+
+        n: typing.Optional[int] = None
+
+    for n in (None, 2, None, 3, 1):
+        await TestModel(n=n).create()
+
+    for order, expected in (
+        (TestModel.n, [None, None, 1, 2, 3]),
+        (TestModel.n.desc(), [3, 2, 1, None, None]),
+    ):
+        values, token = [], None
+        while True:
+            page, token = await TestModel.paginate(
+                order_by=[order], after=token, limit=2
+            )
+            values.extend(obj.n for obj in page)
+            if token is None:
+                break
+        assert values == expected
+
+
+@pytest.mark.asyncio
+async def test_model_aggregate(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class User(Model):
+        name: str
+
+    @db
+    class Order(Model):
+        user: Reference[User] = Field(alias="u")
+        total: int = Field(alias="t")
+        tags: list[str] = Field(default_factory=list)
+
+    class Totals(BaseModel):
+        id: ObjectId = Field(alias="_id")
+        total: int
+        count: int
+
+    alice = await User(name="Alice").create()
+    bob = await User(name="Bob").create()
+    for user, total in [(alice, 10), (alice, 20), (bob, 5), (bob, 50)]:
+        await Order(user=user, total=total, tags=["a", "b"]).create()
+
+    collection = Order.collection()
+    aggregate = collection.aggregate
+    mock = mocker.patch.object(
+        collection,
+        "aggregate",
+        mocker.AsyncMock(side_effect=lambda stages, **kwargs: aggregate(stages)),
+    )
+
+    pipeline = (
+        Order.aggregate()
+        .match(Order.total > 5)
+        .group(Order.user, total={"$sum": Order.total}, count={"$sum": 1})
+        .sort(("total", DESC))
+        .into(Totals)
+    )
+    assert pipeline.stages[:2] == [
+        {"$match": {"t": {"$gt": 5}}},
+        {"$group": {"_id": "$u", "total": {"$sum": "$t"}, "count": {"$sum": 1}}},
+    ]
+
+    results = [r async for r in pipeline.iter(batch_size=10, allow_disk_use=True)]
+    assert results == [
+        Totals(_id=bob.id, total=50, count=1),
+        Totals(_id=alice.id, total=30, count=2),
+    ]
+    assert mock.call_args.kwargs == {"batchSize": 10, "allowDiskUse": True}
+
+    assert Order.aggregate().match(total=5).stages == [{"$match": {"t": 5}}]
+
+    rows = await (
+        Order.aggregate()
+        .match(user=bob)
+        .lookup(User, Order.user, User.id, "owner")
+        .unwind("owner")
+        .unwind(Order.tags)
+        .project(Order.tags, name="$owner.name", _id=0)
+        .all()
+    )
+    assert rows == [{"tags": t, "name": "Bob"} for t in "abab"]
+
+    [facets] = await (
+        Order.aggregate()
+        .facet(
+            big=Order.aggregate().match(Order.total >= 20).project(Order.total),
+            count=[{"$count": "n"}],
+        )
+        .all()
+    )
+    assert [f["t"] for f in facets["big"]] == [20, 50]
+    assert facets["count"] == [{"n": 4}]
+
+    [order] = await Order.aggregate().sort(Order.total).limit(1).into(Order).all()
+    assert isinstance(order, Order) and order.total == 5
+
+
+class Color(enum.Enum):
+    RED = "red"
+    BLUE = "blue"
+
+
+class CodecItem(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str = Field(alias="n")
+    price: bson.Decimal128
+
+
+class CodecSerialized(BaseModel):
+    value: int
+
+    @field_serializer("value")
+    def serialize_value(self, value: int) -> int:
+        return value * 2
+
+
+def test_model_codec():
+    class Author(Model):
+        name: str
+
+    class TestModel(Model):
+        title: str = Field(alias="t")
+        owner: ObjectId
+        created: datetime.datetime
+        color: Color
+        tags: list[str]
+        counts: dict[str, int]
+        labels: set[str]
+        item: CodecItem
+        items: list[CodecItem]
+        missing: typing.Optional[CodecItem] = None
+        author: Reference[Author]
+        editor: typing.Optional[Reference[Author]] = None
+        shade: typing.Optional[Color] = None
+        hue: typing.Union[int, Color] = 0
+        doubled: typing.Annotated[int, PlainSerializer(lambda v: v * 2)]
+        serialized: CodecSerialized
+        extra: dict
+
+    doc = {
+        "_id": bson.ObjectId(),
+        "t": "Title",
+        "owner": bson.ObjectId(),
+        "created": datetime.datetime(2024, 1, 1),
+        "color": "red",
+        "tags": ["a", "b"],
+        "counts": {"a": 1},
+        "labels": ["x"],
+        "item": {"n": "Item", "price": bson.Decimal128("1.5")},
+        "items": [{"n": "Other", "price": bson.Decimal128("2")}],
+        "author": bson.ObjectId(),
+        "editor": bson.ObjectId(),
+        "shade": "red",
+        "hue": "red",
+        "doubled": 2,
+        "serialized": {"value": 3},
+        "extra": {"nested": [{"a": 1}]},
+    }
+
+    obj = TestModel.model_validate(doc)
+    codec = _codec(TestModel)
+    assert codec.encode(obj, codec.document_fields) == obj.model_dump(
+        by_alias=True, exclude={"id"}
+    )
+    assert obj._make_dump()["doubled"] == 4
+    assert obj._make_dump()["serialized"] == {"value": 6}
+    assert obj._make_dump()["tags"] is not obj.tags
+
+    constructed = codec.decode(doc)
+    assert constructed.model_dump() == obj.model_dump()
+    assert constructed.editor == Reference(Author, doc["editor"])
+    assert constructed.shade is Color.RED and constructed.hue is Color.RED
+    assert constructed.extra["nested"] is not doc["extra"]["nested"]
+
+
+@pytest.mark.asyncio
+async def test_model_lazy_load(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str = Field(alias="n")
+        num: int
+        tags: list[str] = Field(default_factory=list)
+        item: typing.Optional[CodecItem] = None
+        note: str = "default"
+
+    TestModel.collection().codec_options = bson.codec_options.DEFAULT_CODEC_OPTIONS
+
+    obj = await TestModel(
+        name="Test",
+        num=1,
+        tags=["a"],
+        item={"n": "Item", "price": bson.Decimal128("1")},
+    ).create()
+    await TestModel.collection().update_one({"_id": obj.id}, {"$unset": {"note": 1}})
+
+    class RawCursor:
+        def __init__(self, docs):
+            self.docs = docs
+
+        async def __aiter__(self):
+            for doc in self.docs:
+                yield doc
+
+    docs = [
+        RawBSONDocument(bson.encode(d)) async for d in TestModel.collection().find()
+    ]
+    raw_collection = mocker.Mock(find=mocker.Mock(return_value=RawCursor(docs)))
+    mocker.patch.object(TestModel, "raw_collection", return_value=raw_collection)
+
+    validate = mocker.spy(TestModel, "model_validate")
+    [lazy] = await TestModel.get_many(_lazy=True)
+    validate.assert_not_called()
+
+    assert lazy.id == obj.id
+    assert lazy.__dict__.keys() == {"id"}
+    assert lazy.name == "Test"
+    assert lazy.__dict__.keys() == {"id", "name"}
+    assert lazy.item == CodecItem(n="Item", price=bson.Decimal128("1"))
+    assert lazy.note == "default"
+
+    lazy.tags.append("b")
+    await lazy.push_update()
+    assert (await TestModel.get(id=obj.id)).tags == ["a", "b"]
+
+    trusted = TestModel._load(docs[0], trusted=True)
+    assert trusted.num == 1 and isinstance(trusted.item, CodecItem)
+
+    replaced = TestModel._load(docs[0])
+    replaced.num = 2
+    await replaced.replace()
+    assert await TestModel.collection().find_one({"_id": obj.id}) == {
+        "_id": obj.id,
+        "n": "Test",
+        "num": 2,
+        "tags": ["a"],
+        "item": {"n": "Item", "price": bson.Decimal128("1")},
+        "note": "default",
+    }
+
+
+@pytest.mark.asyncio
+async def test_model_lazy_load_serialization(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str = Field(alias="n")
+        tags: list[str] = Field(default_factory=list)
+
+    TestModel.collection().codec_options = bson.codec_options.DEFAULT_CODEC_OPTIONS
+
+    obj = await TestModel(name="Test", tags=["a"]).create()
+    doc = await TestModel.collection().find_one({"_id": obj.id})
+
+    def lazy():
+        return TestModel._load(RawBSONDocument(bson.encode(doc)))
+
+    expected = {"id": obj.id, "name": "Test", "tags": ["a"]}
+    assert lazy().model_dump() == expected
+    assert json.loads(lazy().model_dump_json()) == {**expected, "id": str(obj.id)}
+    assert repr(lazy()) == repr(obj)
+    assert lazy().as_base() == obj.as_base()
+    assert lazy() == TestModel._load(doc)
+    assert TestModel._load(doc) == lazy()
+
+
+class PickledModel(Model):
+    name: str
+    tags: list[str] = Field(default_factory=list)
+    meta: dict[str, int] = Field(default_factory=dict)
+
+
+@pytest.mark.asyncio
+async def test_model_copy_and_pickle(mock_mongoclient):
+    db = Database(name="test")
+    TestModel = db(PickledModel)
+
+    obj = await TestModel(name="Test", tags=["a"], meta={"a": 1}).create()
+    loaded = await TestModel.get(id=obj.id)
+
+    restored = pickle.loads(pickle.dumps(loaded))
+    assert restored == loaded
+    restored.tags.append("b")
+    restored.meta["b"] = 2
+    assert restored._get_state_diff() != {}
+
+    copied = copy.deepcopy(loaded)
+    copied.tags.append("c")
+    assert loaded._get_state_diff() == {} and loaded.tags == ["a"]
+    await copied.push_update()
+    assert (await TestModel.get(id=obj.id)).tags == ["a", "c"]
+
+    shallow = copy.copy(loaded)
+    shallow.meta["c"] = 3
+    assert loaded._get_state_diff() == {}
+    assert shallow._get_state_diff() != {}
+
+
+@pytest.mark.asyncio
+async def test_model_equality_ignores_tracking(mock_mongoclient):
+    db = Database(name="test")
+    TestModel = db(PickledModel)
+
+    obj = await TestModel(name="Test").create()
+    await TestModel.collection().update_one({"_id": obj.id}, {"$unset": {"meta": 1}})
+
+    first = await TestModel.get(id=obj.id)
+    second = await TestModel.get(id=obj.id)
+    first.name = first.name
+    assert first == second
+    assert first == TestModel(id=obj.id, name="Test", tags=[])
+    assert first != TestModel(id=obj.id, name="Other")
+
+
+@pytest.mark.asyncio
+async def test_model_copy_then_save(mock_mongoclient):
+    db = Database(name="test")
+    TestModel = db(PickledModel)
+
+    obj = await TestModel(name="a").create()
+    loaded = await TestModel.get(id=obj.id)
+
+    for copied in (loaded.model_copy(), copy.copy(loaded)):
+        loaded.name = "b"
+        await copied.push_update()
+        assert loaded._get_state_diff() == {"name": "b"}
+        await loaded.push_update()
+        assert (await TestModel.get(id=obj.id)).name == "b"
+
+        loaded.name = "a"
+        await loaded.push_update()
+
+
+@pytest.mark.asyncio
+async def test_model_untracked_containers(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        tags: list[str]
+        meta: dict[str, int]
+
+        def model_post_init(self, context: typing.Any) -> None:
+            pass
+
+    obj = await TestModel(tags=["a"], meta={"a": 1}).create()
+    loaded = await TestModel.get(id=obj.id)
+
+    loaded.tags.append("b")
+    loaded.meta["b"] = 2
+    await loaded.push_update()
+
+    reloaded = await TestModel.get(id=obj.id)
+    assert reloaded.tags == ["a", "b"]
+    assert reloaded.meta == {"a": 1, "b": 2}
+
+
+@pytest.mark.asyncio
+async def test_model_writer(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    insert_many = mocker.spy(TestModel.collection(), "insert_many")
+
+    async with TestModel.writer(max_batch=3, max_delay_ms=10) as writer:
+        objs = [TestModel(name=f"Test {i}") for i in range(4)]
+        for obj in objs:
+            await writer.put(obj)
+
+        await asyncio.sleep(0)
+        assert insert_many.call_count == 1
+        assert insert_many.call_args.kwargs == {"ordered": False}
+
+        await writer.flush()
+        assert insert_many.call_count == 2
+
+        with pytest.raises(AlreadyExists):
+            await writer.put(objs[0])
+
+    assert all(obj.id for obj in objs)
+    assert objs[0]._get_state_diff() == {}
+    assert await TestModel.collection().count_documents({}) == 4
+
+    with pytest.raises(RuntimeError):
+        await writer.put(TestModel(name="Closed"))
+
+
+@pytest.mark.asyncio
+async def test_model_writer_backpressure(mock_mongoclient):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    writer = TestModel.writer(max_queue=1)
+    writer.put_nowait(TestModel(name="First"))
+    with pytest.raises(asyncio.QueueFull):
+        writer.put_nowait(TestModel(name="Second"))
+
+    await writer.close()
+    assert await TestModel.collection().count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_model_writer_retry(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    original = TestModel.collection().insert_many
+    insert_many = mocker.AsyncMock(
+        side_effect=[
+            AutoReconnect("connection reset"),
+            BulkWriteError(
+                {"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate"}]}
+            ),
+        ]
+    )
+    TestModel.collection().insert_many = insert_many
+    mocker.patch("asyncio.sleep", mocker.AsyncMock())
+
+    writer = TestModel.writer(retries=1)
+    ok, failed = TestModel(name="Ok"), TestModel(name="Failed")
+    await writer.put(ok)
+    await writer.put(failed)
+    await writer.flush()
+
+    assert insert_many.await_count == 2
+    assert insert_many.await_args_list[0] == insert_many.await_args_list[1]
+    assert ok.id and failed.id is None
+    assert writer.failed == [
+        (failed, {"index": 1, "code": 11000, "errmsg": "duplicate"})
+    ]
+
+    TestModel.collection().insert_many = original
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_database_close_drains_writers(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    close = mocker.patch.object(db.client, "close", mocker.AsyncMock())
+
+    writer = TestModel.writer(max_delay_ms=1000)
+    await writer.put(TestModel(name="Test"))
+
+    await db.close()
+    close.assert_awaited_once()
+    assert await TestModel.collection().count_documents({}) == 1
+    assert writer._task is None
+
+
+@pytest.mark.asyncio
+async def test_model_collection_options(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        class Meta:
+            WRITE_CONCERN = WriteConcern(w=1)
+
+        name: str
+
+    base = TestModel._collection = db.db.get_collection("testmodel")
+    inner = base._AsyncMongoMockCollection__collection
+    with_options = mocker.patch.object(
+        base,
+        "with_options",
+        side_effect=lambda **kw: AsyncMongoMockCollection(
+            base.database, inner.with_options(**kw)
+        ),
+    )
+
+    default = TestModel.collection()
+    assert default is not base
+    assert default.write_concern == WriteConcern(w=1)
+    assert TestModel.collection() is default
+
+    secondary = TestModel.collection(
+        read_preference=ReadPreference.SECONDARY_PREFERRED,
+        read_concern=ReadConcern("local"),
+    )
+    assert secondary.write_concern == WriteConcern(w=1)
+    assert secondary.read_preference == ReadPreference.SECONDARY_PREFERRED
+    assert secondary.read_concern == ReadConcern("local")
+    assert (
+        TestModel.collection(
+            read_preference=ReadPreference.SECONDARY_PREFERRED,
+            read_concern=ReadConcern("local"),
+        )
+        is secondary
+    )
+
+    majority = TestModel.collection(write_concern=WriteConcern(w="majority"))
+    assert majority.write_concern == WriteConcern(w="majority")
+    assert with_options.call_count == 3
+
+    obj = await TestModel(name="Test").create(_write_concern=WriteConcern(w="majority"))
+    await TestModel.update_many(
+        {}, {"$set": {"name": "Test"}}, _write_concern=WriteConcern(w="majority")
+    )
+    find = mocker.spy(secondary, "find")
+    [loaded] = await TestModel.get_many(
+        _read_preference=ReadPreference.SECONDARY_PREFERRED,
+        _read_concern=ReadConcern("local"),
+    )
+    assert loaded.id == obj.id
+    find.assert_called_once()
+
+    assert (
+        await TestModel.count(
+            _read_preference=ReadPreference.SECONDARY_PREFERRED,
+            _read_concern=ReadConcern("local"),
+        )
+        == 1
+    )
+    assert with_options.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_deadline(mock_mongoclient, mocker):
+    db = Database(name="test")
+
+    @db
+    class TestModel(Model):
+        name: str
+
+    await TestModel(name="Test").create()
+
+    remaining = []
+    original = TestModel.collection().find_one
+
+    async def find_one(*args, **kwargs):
+        remaining.append(pymongo._csot.remaining())
+        return await original(*args, **kwargs)
+
+    TestModel.collection().find_one = find_one
+
+    await TestModel.get(name="Test")
+    async with deadline(0.5):
+        await TestModel.get(name="Test")
+        with deadline(10):
+            await TestModel.get(name="Test", _timeout=10)
+    await TestModel.get(name="Test", _timeout=0.2)
+
+    assert remaining[0] is None
+    assert 0 < remaining[1] <= 0.5
+    assert 0 < remaining[2] <= remaining[1]
+    assert 0 < remaining[3] <= 0.2
+    assert pymongo._csot.remaining() is None
+
+    TestModel.collection().count_documents = mocker.AsyncMock(
+        side_effect=ExecutionTimeout("operation exceeded time limit", 50)
+    )
+    with pytest.raises(QueryTimeout) as exc_info:
+        await TestModel.count(_timeout=0.1)
+    assert isinstance(exc_info.value, TimeoutError)
+    assert exc_info.value.seconds == 0.1
+
+    with pytest.raises(QueryTimeout):
+        async with deadline(1):
+            await TestModel.query().count()
+
+    with pytest.raises(ExecutionTimeout):
+        await TestModel.count()
+
+    TestModel.collection().count_documents = mocker.AsyncMock(
+        side_effect=OperationFailure("failed", 2)
+    )
+    with pytest.raises(OperationFailure):
+        await TestModel.count(_timeout=0.1)
+
+    max_time_ms = mocker.spy(mongomock.collection.Cursor, "max_time_ms")
+    assert [obj.name async for obj in TestModel.iter(_timeout=0.25)] == ["Test"]
+    assert max_time_ms.call_args.args[1] == 250
+
+
+@pytest.mark.asyncio
+async def test_database_metrics(mock_mongoclient, mocker):
+    records = []
+    metrics = Metrics(slow_ms=None, callback=records.append)
+    db = Database(name="test", metrics=metrics)
+
+    @db
+    class TestModel(Model):
+        name: str = Field(alias="n")
+        num: int = 0
+
+    obj = await TestModel(name="Test").create()
+    await TestModel(name="Other", num=1).save()
+    obj.num = 2
+    await obj.save()
+
+    await TestModel.get(n="Test")
+    assert len(await TestModel.get_many(_where=TestModel.num >= 1)) == 2
+
+    async for _ in TestModel.iter():
+        await TestModel.count()
+
+    with pytest.raises(DoesNotExist):
+        await TestModel.get(n="Missing")
+
+    mocker.patch.object(TestModel.collection(), "bulk_write", mocker.AsyncMock())
+    async with db.unit_of_work() as uow:
+        uow.add(TestModel(name="New"))
+
+    assert [(op.model, op.name) for op in records] == [
+        ("TestModel", "create"),
+        ("TestModel", "create"),
+        ("TestModel", "push_update"),
+        ("TestModel", "get"),
+        ("TestModel", "get_many"),
+        ("TestModel", "count"),
+        ("TestModel", "count"),
+        ("TestModel", "iter"),
+        ("TestModel", "get"),
+        ("TestModel", "bulk"),
+    ]
+
+    create, _, update, get, get_many, count, _, iterate, missing, bulk = records
+    assert create.bytes_sent > 0 and create.documents == 0
+    assert update.filter == {"_id": "?"}
+    assert get.filter == {"n": "?"} and get.documents == 1
+    assert get_many.filter == {"num": {"$gte": "?"}} and get_many.documents == 2
+    assert get_many.validation > 0 and get_many.wire > 0
+    assert count.documents == 0
+    assert iterate.documents == 2
+    assert missing.error == "DoesNotExist"
+    assert bulk.bytes_sent > 0
+
+    stats = metrics.snapshot()["TestModel"]
+    assert stats["create"]["latency"]["count"] == 2
+    assert stats["get"]["errors"] == 1
+    assert stats["get_many"]["documents"] == 2
+
+    db.metrics = None
+    await TestModel.get(n="Test")
+    assert len(records) == 10
@@ -1,4 +1,7 @@
-from morm.utils import recursive_diff
+import copy
+import pickle
+
+from morm.utils import TrackedDict, TrackedList, recursive_diff, update_diff
 
 
 def test_recursive_diff():
@@ -42,3 +45,93 @@ def test_recursive_diff_scalar_to_dict():
     prev = {"x": 1}
     curr = {"x": {"a": 2}}
     assert recursive_diff(prev, curr) == {"x": {"a": 2}}
+
+
+def test_tracked_list():
+    changes = []
+    tracked = TrackedList([1, 2], lambda: changes.append(True))
+
+    assert tracked == [1, 2]
+    assert len(changes) == 0
+
+    tracked.append(3)
+    tracked[0] = 0
+    tracked += [4]
+    del tracked[1]
+
+    assert tracked == [0, 3, 4]
+    assert len(changes) == 4
+
+
+def test_tracked_dict():
+    changes = []
+    tracked = TrackedDict({"a": 1}, lambda: changes.append(True))
+
+    assert tracked["a"] == 1
+    assert len(changes) == 0
+
+    tracked["b"] = 2
+    tracked.update(c=3)
+    tracked.pop("a")
+
+    assert tracked == {"b": 2, "c": 3}
+    assert len(changes) == 3
+
+
+def test_tracked_containers_copy():
+    changes = []
+    tracked_list = TrackedList([[1], 2], lambda: changes.append(True))
+    tracked_dict = TrackedDict({"a": [1]}, lambda: changes.append(True))
+
+    for tracked, plain in ((tracked_list, list), (tracked_dict, dict)):
+        for result in (
+            copy.copy(tracked),
+            copy.deepcopy(tracked),
+            pickle.loads(pickle.dumps(tracked)),
+        ):
+            assert type(result) is plain
+            assert result == tracked
+
+    deep = copy.deepcopy(tracked_list)
+    deep[0].append(2)
+    assert tracked_list == [[1], 2]
+    assert not changes
+
+
+def test_update_diff():
+    prev = {
+        "name": "Alex",
+        "events": [1, 2, 3],
+        "data": {"removed": True, "kept": 1},
+        "items": [{"id": i, "flag": False} for i in range(10)],
+    }
+    cur = {
+        "name": "John",
+        "events": [1, 2, 3, 4, 5],
+        "data": {"kept": 1, "new": "flag"},
+        "items": [{"id": i, "flag": i == 3} for i in range(10)],
+    }
+
+    assert update_diff(prev, cur) == {
+        "$set": {"name": "John", "data.new": "flag", "items.3.flag": True},
+        "$unset": {"data.removed": ""},
+        "$push": {"events": {"$each": [4, 5]}},
+    }
+
+
+def test_update_diff_list_replace():
+    assert update_diff({"tags": ["a", "b"]}, {"tags": ["c", "d"]}) == {
+        "$set": {"tags": ["c", "d"]}
+    }
+    assert update_diff({"tags": ["a", "b", "c"]}, {"tags": ["a", "c"]}) == {
+        "$set": {"tags": ["a", "c"]}
+    }
+    assert update_diff({"tags": []}, {"tags": ["a"]}) == {"$set": {"tags": ["a"]}}
+
+
+def test_update_diff_unset_keys():
+    prev = {"extra": 1, "data": {"a": 1}, "other": {"a": 1}}
+    cur = {"data": {}, "other": {}}
+
+    assert update_diff(prev, cur, unset={"data"}) == {"$unset": {"data.a": ""}}
+    assert update_diff(prev, cur, unset=False) == {}